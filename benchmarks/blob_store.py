@@ -0,0 +1,81 @@
+"""Benchmark: loading campaign sets.
+
+Stores the same campaign sets as one JSON file per customer (the legacy
+layout) and in a ses.blobs.BlobStore pack, then times loading all of
+them back in a fresh store. No network access is needed.
+
+    pipenv run python benchmarks/blob_store.py [--customers N] [--campaigns N]
+"""
+
+import json
+import os
+import random
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from ses.blobs import BlobStore, canonical_json
+
+
+def load_legacy(directory, sha1_hashes):
+    for sha1_hash in sha1_hashes:
+        with open(os.path.join(directory, sha1_hash), 'rb') as f:
+            json.load(f)
+
+
+def load_packed(directory, sha1_hashes):
+    store = BlobStore(directory)
+    for sha1_hash in sha1_hashes:
+        store.load(sha1_hash)
+
+
+def measure(func, *args):
+    started = time.perf_counter()
+    func(*args)
+
+    return time.perf_counter() - started
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--campaigns', type=int, default=500)
+    args = parser.parse_args()
+
+    campaign_sets = [
+        {
+            'customer_id': customer_id,
+            'campaign_ids': sorted(
+                random.sample(range(10**10, 10**11), args.campaigns)
+            ),
+        }
+        for customer_id in range(10**9, 10**9 + args.customers)
+    ]
+
+    with tempfile.TemporaryDirectory() as legacy:
+        packed = os.path.join(legacy, 'packed')
+        os.mkdir(packed)
+        legacy_store = BlobStore(legacy)
+        legacy_hashes = [legacy_store.store_file(c) for c in campaign_sets]
+        packed_store = BlobStore(packed)
+        packed_hashes = [
+            packed_store.store_campaign_set(**c) for c in campaign_sets
+        ]
+        assert legacy_hashes == packed_hashes
+
+        legacy_size = sum(len(canonical_json(c)) for c in campaign_sets)
+        packed_size = os.path.getsize(packed_store.pack_path)
+
+        for name, func, directory, size in (
+            ('json files', load_legacy, legacy, legacy_size),
+            ('pack', load_packed, packed, packed_size),
+        ):
+            seconds = measure(func, directory, legacy_hashes)
+            print(
+                f'{name:>10}: {args.customers / seconds:9.0f} campaign '
+                f'sets/s, {size / 2**20:6.1f} MiB'
+            )
+
+
+if __name__ == '__main__':
+    main()
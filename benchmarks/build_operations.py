@@ -0,0 +1,77 @@
+"""Micro-benchmark: campaign operations built per second.
+
+Compares building a 1000 operation MutateCampaignsRequest the way the
+mutate loop used to (resolving types and computing a field mask for every
+campaign) with ses.builder.RequestBuilder. No network access is needed.
+
+    pipenv run python benchmarks/build_operations.py [--seconds N]
+"""
+
+import time
+from argparse import ArgumentParser
+
+from google.ads.googleads.client import GoogleAdsClient
+from google.api_core import protobuf_helpers
+
+from ses.builder import RequestBuilder
+
+customer_id = 1234567890
+campaign_ids = list(range(10**10, 10**10 + 1000))
+
+
+def get_operation(client, customer_id, campaign_id):
+    operation = client.get_type('CampaignOperation', version='v19')
+    campaign = operation.update
+    campaign.resource_name = f'customers/{customer_id}/campaigns/{campaign_id}'
+    enum = client.get_type('CampaignStatusEnum', version='v19')
+    campaign.status = enum.PAUSED
+    operation.update_mask.CopyFrom(protobuf_helpers.field_mask(None, campaign))
+
+    return operation
+
+
+def build_per_operation(client):
+    request = client.get_type('MutateCampaignsRequest', version='v19')
+    request.customer_id = str(customer_id)
+    for campaign_id in campaign_ids:
+        request.operations.append(
+            get_operation(client, customer_id, campaign_id)
+        )
+
+    return request
+
+
+def measure(func, seconds):
+    requests = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        func()
+        requests += 1
+
+    return requests * len(campaign_ids) / (time.perf_counter() - started)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--seconds', type=float, default=3.0)
+    args = parser.parse_args()
+
+    client = GoogleAdsClient(
+        credentials=None, developer_token='benchmark', use_proto_plus=False
+    )
+    builder = RequestBuilder(
+        client, is_pause=True, no_dry_run=True, partial_failure=False
+    )
+
+    before = measure(lambda: build_per_operation(client), args.seconds)
+    after = measure(
+        lambda: builder.build(customer_id, campaign_ids), args.seconds
+    )
+
+    print(f'per operation:   {before:12,.0f} operations/s')
+    print(f'RequestBuilder:  {after:12,.0f} operations/s')
+    print(f'speedup:         {after / before:12.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Benchmark: collect, pause and unpause against a stand-in API.
+
+Starts benchmarks/fake_ads_server.py in this process, then runs each
+command in a fresh interpreter with its own cache directory, like a
+user would. Reports each command's wall time, the RPCs the server saw
+and the command's peak memory. No network access is needed.
+
+    pipenv run python benchmarks/end_to_end.py [--customers N] ...
+    pipenv run python benchmarks/end_to_end.py --ses-args='--engine asyncio'
+
+The commands talk plaintext gRPC to localhost: the child processes swap
+the TLS channel the client library would open for an insecure one,
+everything else is the library's regular code path.
+"""
+
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from functools import partial
+
+from fake_ads_server import FakeAds, add_arguments, serve
+
+commands = (
+    'collect',
+    'pause --latest --no-dry-run',
+    'unpause --last-paused --no-dry-run',
+)
+
+
+def connect(port, login_customer_id):
+    """Returns a client talking plaintext gRPC to the stand-in server."""
+    import grpc
+    from google.api_core import grpc_helpers
+    from google.ads.googleads.client import GoogleAdsClient
+    from google.auth.credentials import AnonymousCredentials
+
+    def create_channel(target, *args, options=None, **kwargs):
+        return grpc.insecure_channel(target, options=options)
+
+    grpc_helpers.create_channel = create_channel
+    return GoogleAdsClient(
+        credentials=AnonymousCredentials(),
+        developer_token='benchmark',
+        login_customer_id=str(login_customer_id),
+        endpoint=f'localhost:{port}',
+        use_proto_plus=False,
+    )
+
+
+def peak_mib():
+    # ru_maxrss would also count this harness: a child started with
+    # vfork inherits the high-water mark of the parent's memory.
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+
+
+def run_command(port, login_customer_id, argv):
+    """Runs in the child: executes one sem-emergency-stop command."""
+    from ses import main
+
+    for directory in (
+        main.blob_directory,
+        main.journal_directory,
+        main.armed_directory,
+    ):
+        os.makedirs(directory, exist_ok=True)
+
+    args = main.parse_arguments(argv)
+    started = time.perf_counter()
+    # --processes starts more processes, which connect the same way.
+    main.execute(
+        connect(port, login_customer_id),
+        args,
+        partial(connect, port, login_customer_id),
+    )
+    seconds = time.perf_counter() - started
+    print(json.dumps({'seconds': seconds, 'peak_mib': peak_mib()}))
+
+
+def run_child(port, login_customer_id, home, argv, verbose):
+    process = subprocess.Popen(
+        [
+            sys.executable,
+            __file__,
+            '--child',
+            str(port),
+            str(login_customer_id),
+            *argv,
+        ],
+        env={**os.environ, 'HOME': home},
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    output = process.stdout.read()
+    status = process.wait()
+    if verbose or status:
+        print(output)
+    if status:
+        sys.exit(f'{" ".join(argv)} failed')
+
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        return run_command(int(sys.argv[2]), int(sys.argv[3]), sys.argv[4:])
+
+    parser = ArgumentParser()
+    add_arguments(parser)
+    parser.add_argument(
+        '--ses-args',
+        help='extra arguments for every command, e.g. "--engine asyncio"',
+        default='',
+    )
+    parser.add_argument('-v', '--verbose', action='store_true')
+    args = parser.parse_args()
+
+    ads = FakeAds(args)
+    server, port = serve(ads)
+    campaigns = sum(map(len, ads.campaigns.values()))
+    print(
+        f'{len(ads.campaigns)} customers, {campaigns} campaigns, '
+        f'{args.latency * 1000:.0f} ms median latency, '
+        f'{args.quota_errors:.0%} quota errors'
+    )
+
+    with tempfile.TemporaryDirectory() as home:
+        for command in commands:
+            argv = command.split() + shlex.split(args.ses_args)
+            calls = ads.calls.copy()
+            result = run_child(
+                port, ads.login_customer_id, home, argv, args.verbose
+            )
+            calls = ads.calls - calls
+            print(
+                f'{command.split()[0]:>8}: {result["seconds"]:7.2f} s, '
+                f'{calls["SearchStream"]:5} searches, '
+                f'{calls["MutateCampaigns"]:5} mutates, '
+                f'{calls["errors"]:4} errors, '
+                f'{result["peak_mib"]:6.0f} MiB peak'
+            )
+
+    paused = sum(
+        status != 2 for c in ads.campaigns.values() for status in c.values()
+    )
+    print(f'{paused} campaigns left paused')
+    server.stop(None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,423 @@
+"""A stand-in for the Google Ads API, for benchmarks.
+
+Serves the two endpoints sem-emergency-stop uses,
+GoogleAdsService.SearchStream and CampaignService.MutateCampaigns, over
+plaintext gRPC on localhost. Accounts are generated from a seed, every
+call takes a random latency and may fail with a quota error. Only the
+GAQL that ses/queries.py and ses/scope.py send is understood.
+
+Run it on its own to point other tools at it:
+
+    pipenv run python benchmarks/fake_ads_server.py --port 50051
+"""
+
+import random
+import re
+import threading
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent import futures
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import grpc
+from google.ads.googleads.v19.enums.types import campaign_status
+from google.ads.googleads.v19.errors.types import errors
+from google.ads.googleads.v19.services.types import (
+    campaign_service,
+    google_ads_service,
+)
+from google.rpc import status_pb2
+
+version = 'v19'
+services = f'google.ads.googleads.{version}.services'
+failure_key = f'google.ads.googleads.{version}.errors.googleadsfailure-bin'
+
+GoogleAdsRow = google_ads_service.GoogleAdsRow.pb()
+SearchRequest = google_ads_service.SearchGoogleAdsStreamRequest.pb()
+SearchResponse = google_ads_service.SearchGoogleAdsStreamResponse.pb()
+MutateRequest = campaign_service.MutateCampaignsRequest.pb()
+MutateResponse = campaign_service.MutateCampaignsResponse.pb()
+GoogleAdsFailure = errors.GoogleAdsFailure.pb()
+CampaignStatus = campaign_status.CampaignStatusEnum.pb().CampaignStatus
+
+rows_per_response = 10000
+# Campaigns cycle through these, for scoped stops to select from.
+channel_types = ('SEARCH', 'DISPLAY', 'SHOPPING', 'PERFORMANCE_MAX')
+markets = (('us', 2840), ('de', 2276), ('fr', 2250), ('gb', 2826))
+# Every account is in this time zone, which is what change_status times
+# are in.
+time_zone = ZoneInfo('America/New_York')
+match_campaign = re.compile(r'^customers/(\d+)/campaigns/(\d+)$').match
+match_label = re.compile(r'^customers/\d+/labels/(\d+)$').match
+
+
+def campaign_name(campaign_id):
+    code = markets[market(campaign_id)][0]
+    return f'{code.upper()} {channel_type(campaign_id).lower()} {campaign_id}'
+
+
+def channel_type(campaign_id):
+    return channel_types[campaign_id % len(channel_types)]
+
+
+def market(campaign_id):
+    return campaign_id // len(channel_types) % len(markets)
+
+
+def add_arguments(parser):
+    parser.add_argument('--customers', type=int, default=100)
+    parser.add_argument(
+        '--campaigns',
+        help='median number of campaigns per customer',
+        type=int,
+        default=1000,
+    )
+    parser.add_argument(
+        '--size-sigma',
+        help='sigma of the log-normal customer sizes (0 for equal sizes)',
+        type=float,
+        default=1.0,
+    )
+    parser.add_argument(
+        '--latency',
+        help='median seconds per call',
+        type=float,
+        default=0.05,
+    )
+    parser.add_argument(
+        '--latency-sigma',
+        help='sigma of the log-normal latency (0 for constant latency)',
+        type=float,
+        default=0.5,
+    )
+    parser.add_argument(
+        '--latency-per-operation',
+        help='extra seconds per mutate operation',
+        type=float,
+        default=0.0002,
+    )
+    parser.add_argument(
+        '--quota-errors',
+        help=(
+            'fraction of calls, and of later responses of streams, failing '
+            'with RESOURCE_EXHAUSTED'
+        ),
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument(
+        '--lost-updates',
+        help='fraction of mutate operations reported done but not applied',
+        type=float,
+        default=0.0,
+    )
+    parser.add_argument('--seed', type=int, default=1)
+
+
+class FakeAds:
+    def __init__(self, args):
+        self.args = args
+        self.login_customer_id = 10**9
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.random = random.Random(args.seed)
+
+        self.campaigns = {}
+        self.changed_at = {}
+        campaign_id = 10**10
+        for i in range(args.customers):
+            size = int(
+                args.campaigns * self.random.lognormvariate(0, args.size_sigma)
+            )
+            self.campaigns[self.login_customer_id + 1 + i] = {
+                campaign_id + j: CampaignStatus.ENABLED for j in range(size)
+            }
+            campaign_id += size
+
+    def delay(self, seconds, context):
+        with self.lock:
+            sigma = self.args.latency_sigma
+            latency = self.args.latency * self.random.lognormvariate(0, sigma)
+        time.sleep(latency + seconds)
+        self.throttle(context)
+
+    def throttle(self, context):
+        with self.lock:
+            throttled = self.random.random() < self.args.quota_errors
+
+        if throttled:
+            failure = GoogleAdsFailure()
+            error = failure.errors.add()
+            error.error_code.quota_error = 2  # RESOURCE_EXHAUSTED
+            error.message = 'Too many requests.'
+            context.set_trailing_metadata(
+                ((failure_key, failure.SerializeToString()),)
+            )
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, 'quota')
+
+    def count(self, method, context):
+        with self.lock:
+            self.calls[method] += 1
+            if context.code() is not None:
+                self.calls['errors'] += 1
+
+    def customer_client_rows(self):
+        rows = []
+        for level, customer_id in [(0, self.login_customer_id)] + [
+            (1, customer_id) for customer_id in self.campaigns
+        ]:
+            row = GoogleAdsRow()
+            client = row.customer_client
+            client.resource_name = (
+                f'customers/{self.login_customer_id}/customerClients/'
+                f'{customer_id}'
+            )
+            client.client_customer = f'customers/{customer_id}'
+            client.id = customer_id
+            client.level = level
+            client.manager = level == 0
+            client.status = 2  # ENABLED
+            rows.append(row)
+
+        return rows
+
+    def campaign_rows(self, customer_id, query):
+        """Campaigns matching the conditions ses/queries.py and
+        ses/scope.py send."""
+        campaigns = self.campaigns.get(customer_id, {})
+        status = re.search(r"campaign\.status = '(\w+)'", query)
+        name = re.search(
+            r"campaign\.name REGEXP_MATCH '((?:[^'\\]|\\.)*)'", query
+        )
+        types = re.search(r'advertising_channel_type IN \(([^)]*)\)', query)
+        labels = re.search(r'campaign\.labels CONTAINS ANY \(([^)]*)\)', query)
+        ids = re.search(r'campaign\.id IN \(([\d, ]+)\)', query)
+        if ids:
+            ids = sorted(
+                int(i) for i in ids.group(1).split(',') if int(i) in campaigns
+            )
+        else:
+            ids = sorted(campaigns)
+        if name:
+            name = re.compile(re.sub(r"\\(['\\])", r'\1', name.group(1)))
+        if types:
+            types = set(re.findall(r"'(\w+)'", types.group(1)))
+        if labels:
+            labels = {
+                int(match_label(resource_name).group(1))
+                for resource_name in re.findall(r"'([^']+)'", labels.group(1))
+            }
+
+        rows = []
+        for campaign_id in ids:
+            if status and campaigns[campaign_id] != CampaignStatus.Value(
+                status.group(1)
+            ):
+                continue
+            if name and not name.search(campaign_name(campaign_id)):
+                continue
+            if types and channel_type(campaign_id) not in types:
+                continue
+            if labels and market(campaign_id) not in labels:
+                continue
+            row = GoogleAdsRow()
+            row.campaign.resource_name = (
+                f'customers/{customer_id}/campaigns/{campaign_id}'
+            )
+            row.campaign.id = campaign_id
+            row.campaign.status = campaigns[campaign_id]
+            rows.append(row)
+
+        return rows
+
+    def label_rows(self, customer_id, query):
+        """Every customer has a label per market, e.g. 'market-us'."""
+        names = set(re.findall(r"'([^']+)'", query))
+        rows = []
+        for index, (code, _) in enumerate(markets):
+            if f'market-{code}' in names:
+                row = GoogleAdsRow()
+                row.label.resource_name = (
+                    f'customers/{customer_id}/labels/{index}'
+                )
+                rows.append(row)
+
+        return rows
+
+    def geo_target_rows(self, customer_id, query):
+        """Every campaign targets the country of its market."""
+        constants = {
+            int(i) for i in re.findall(r"'geoTargetConstants/(\d+)'", query)
+        }
+        rows = []
+        for campaign_id in sorted(self.campaigns.get(customer_id, {})):
+            if markets[market(campaign_id)][1] in constants:
+                row = GoogleAdsRow()
+                row.campaign.id = campaign_id
+                rows.append(row)
+
+        return rows
+
+    def change_status_rows(self, customer_id, query):
+        start = re.search(r"BETWEEN '([^']+)'", query).group(1)
+        start = datetime.strptime(start, '%Y-%m-%d %H:%M:%S')
+        limit = int(re.search(r'LIMIT (\d+)', query).group(1))
+
+        rows = []
+        for campaign_id, changed_at in sorted(
+            self.changed_at.get(customer_id, {}).items()
+        ):
+            if changed_at >= start:
+                row = GoogleAdsRow()
+                row.change_status.campaign = (
+                    f'customers/{customer_id}/campaigns/{campaign_id}'
+                )
+                row.change_status.last_change_date_time = (
+                    f'{changed_at:%Y-%m-%d %H:%M:%S}'
+                )
+                rows.append(row)
+
+        return rows[:limit]
+
+    def search_stream(self, request, context):
+        try:
+            self.delay(0, context)
+            customer_id = int(request.customer_id)
+            query = ' '.join(request.query.split())
+            if 'FROM customer_client' in query:
+                rows = self.customer_client_rows()
+            elif 'FROM campaign_criterion' in query:
+                rows = self.geo_target_rows(customer_id, query)
+            elif 'FROM campaign' in query:
+                rows = self.campaign_rows(customer_id, query)
+            elif 'FROM label' in query:
+                rows = self.label_rows(customer_id, query)
+            elif 'FROM change_status' in query:
+                rows = self.change_status_rows(customer_id, query)
+            elif 'FROM customer' in query:
+                row = GoogleAdsRow()
+                row.customer.id = customer_id
+                row.customer.time_zone = time_zone.key
+                rows = [row]
+            else:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, query)
+
+            for i in range(0, max(len(rows), 1), rows_per_response):
+                # Streams can also fail halfway through.
+                if i:
+                    self.throttle(context)
+                response = SearchResponse()
+                response.results.extend(
+                    rows[i : i + rows_per_response]  # noqa: E203
+                )
+                yield response
+        finally:
+            self.count('SearchStream', context)
+
+    def mutate_campaigns(self, request, context):
+        try:
+            self.delay(
+                len(request.operations) * self.args.latency_per_operation,
+                context,
+            )
+            response = MutateResponse()
+            failure = GoogleAdsFailure()
+            updates = []
+
+            for index, operation in enumerate(request.operations):
+                match = match_campaign(operation.update.resource_name)
+                campaigns = self.campaigns.get(int(request.customer_id), {})
+                if not match or int(match.group(2)) not in campaigns:
+                    error = failure.errors.add()
+                    error.error_code.campaign_error = 4  # CAMPAIGN_NOT_FOUND
+                    error.message = 'Campaign not found.'
+                    error.location.field_path_elements.add(
+                        field_name='operations', index=index
+                    )
+                    response.results.add()
+                    continue
+
+                updates.append((int(match.group(2)), operation.update.status))
+                response.results.add(
+                    resource_name=operation.update.resource_name
+                )
+
+            if failure.errors and not request.partial_failure:
+                context.set_trailing_metadata(
+                    ((failure_key, failure.SerializeToString()),)
+                )
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'failed')
+            if failure.errors:
+                status = status_pb2.Status(code=3, message='partial failure')
+                status.details.add().Pack(failure)
+                response.partial_failure_error.CopyFrom(status)
+
+            if not request.validate_only:
+                now = datetime.now(time_zone).replace(tzinfo=None)
+                with self.lock:
+                    customer_id = int(request.customer_id)
+                    changed_at = self.changed_at.setdefault(customer_id, {})
+                    for campaign_id, status in updates:
+                        if self.random.random() < self.args.lost_updates:
+                            continue
+                        self.campaigns[customer_id][campaign_id] = status
+                        changed_at[campaign_id] = now
+
+            return response
+        finally:
+            self.count('MutateCampaigns', context)
+
+
+def serve(ads, port=0, workers=512):
+    """Starts serving `ads`, returns the server and its port."""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=workers))
+    server.add_generic_rpc_handlers(
+        (
+            grpc.method_handlers_generic_handler(
+                f'{services}.GoogleAdsService',
+                {
+                    'SearchStream': grpc.unary_stream_rpc_method_handler(
+                        ads.search_stream,
+                        request_deserializer=SearchRequest.FromString,
+                        response_serializer=SearchResponse.SerializeToString,
+                    ),
+                },
+            ),
+            grpc.method_handlers_generic_handler(
+                f'{services}.CampaignService',
+                {
+                    'MutateCampaigns': grpc.unary_unary_rpc_method_handler(
+                        ads.mutate_campaigns,
+                        request_deserializer=MutateRequest.FromString,
+                        response_serializer=MutateResponse.SerializeToString,
+                    ),
+                },
+            ),
+        )
+    )
+    port = server.add_insecure_port(f'localhost:{port}')
+    server.start()
+
+    return server, port
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--port', type=int, default=50051)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    ads = FakeAds(args)
+    server, port = serve(ads, args.port)
+    campaigns = sum(map(len, ads.campaigns.values()))
+    print(
+        f'serving {len(ads.campaigns)} customers with {campaigns} campaigns '
+        f'on localhost:{port}, login customer id {ads.login_customer_id}'
+    )
+    server.wait_for_termination()
+
+
+if __name__ == '__main__':
+    main()
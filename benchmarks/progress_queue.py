@@ -0,0 +1,89 @@
+"""Micro-benchmark: per-event overhead of progress reporting.
+
+Worker threads put progress events on the queue the way the mutate and
+collect workers do, while a monitor thread draws them, with stdout sent
+to /dev/null. Compares redrawing on every event (how progress_monitor
+used to work) with ses.main.progress_monitor, which draws once per tick.
+No network access is needed.
+
+    pipenv run python benchmarks/progress_queue.py [--events N] [--threads N]
+"""
+
+import contextlib
+import os
+import time
+from argparse import ArgumentParser
+from collections import defaultdict
+from queue import Queue
+from threading import Thread
+
+from ses.main import progress_monitor
+from ses.progress import Renderer
+
+totals = {'customers': 1000, 'campaigns': 10**6}
+
+
+def redraw_every_event(renderer, progress_queue, exit_queue):
+    progress = defaultdict(int)
+
+    while True:
+        metric, n = progress_queue.get()
+        progress[metric] += n
+        renderer.render(progress, final=metric == 'exit')
+
+        if metric == 'exit':
+            exit_queue.put(True)
+            return
+
+
+def drain(renderer, progress_queue, exit_queue):
+    while progress_queue.get()[0] != 'exit':
+        pass
+    exit_queue.put(True)
+
+
+def measure(monitor, mode, events, threads):
+    progress_queue = Queue()
+    exit_queue = Queue()
+    Thread(
+        target=monitor,
+        args=(Renderer(mode, 'pause', totals), progress_queue, exit_queue),
+    ).start()
+
+    def work():
+        for i in range(events // threads):
+            progress_queue.put(('campaigns', 1))
+
+    started = time.perf_counter()
+    workers = [Thread(target=work) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    progress_queue.put(('exit', 1))
+    exit_queue.get()
+
+    return (time.perf_counter() - started) / events
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    with open(os.devnull, 'w') as devnull:
+        for name, monitor, mode in (
+            ('queue only', drain, 'text'),
+            ('every event, text', redraw_every_event, 'text'),
+            ('every event, jsonl', redraw_every_event, 'jsonl'),
+            ('per tick, text', progress_monitor, 'text'),
+            ('per tick, jsonl', progress_monitor, 'jsonl'),
+        ):
+            with contextlib.redirect_stdout(devnull):
+                seconds = measure(monitor, mode, args.events, args.threads)
+            print(f'{name:>20}: {seconds * 10**9:8.0f} ns/event')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Benchmark: CLI startup time.
+
+Times fresh interpreters running `--help`, importing what the token
+commands need, and importing the client library with the generated
+modules a pause uses. "cold" runs start with an empty bytecode cache
+(like the first run after installing), "warm" runs reuse it. No network
+access is needed.
+
+    pipenv run python benchmarks/startup.py [--runs N]
+"""
+
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+services = 'google.ads.googleads.v19.services'
+
+snippets = {
+    '--help': (
+        'from ses.main import parse_arguments\n'
+        'try:\n'
+        '    parse_arguments(["--help"])\n'
+        'except SystemExit:\n'
+        '    pass\n'
+    ),
+    'ses-create-org-token': 'import ses.auth',
+    'client library': (
+        'import google.ads.googleads.client\n'
+        f'import {services}.services.google_ads_service\n'
+        f'import {services}.services.campaign_service\n'
+    ),
+}
+
+
+def measure(code, pycache):
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, '-X', f'pycache_prefix={pycache}', '-c', code],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+    return time.perf_counter() - started
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    for name, code in snippets.items():
+        cold, warm = [], []
+        for i in range(args.runs):
+            with tempfile.TemporaryDirectory() as pycache:
+                cold.append(measure(code, pycache))
+                warm.append(measure(code, pycache))
+
+        print(
+            f'{name:>22}: {statistics.median(cold) * 1000:6.0f} ms cold, '
+            f'{statistics.median(warm) * 1000:6.0f} ms warm'
+        )
+
+
+if __name__ == '__main__':
+    main()
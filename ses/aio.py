@@ -0,0 +1,341 @@
+"""asyncio execution engine (``--engine=asyncio``).
+
+The Google Ads client library is synchronous, so every RPC still ends up
+on a thread. Instead of a fixed number of long-running workers, each API
+call is a task on one event loop, and a single semaphore bounds how many
+of them are in flight. Progress is printed from the same loop.
+"""
+
+import asyncio
+import time
+import traceback
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+
+from .main import (
+    count_campaigns,
+    create_limiter,
+    Mutation,
+    get_all,
+    get_chunk_indexes,
+    get_chunks,
+    IncompleteCampaignSet,
+    load_since,
+    load_armed_requests,
+    load_campaign_sets_to_send,
+    mutate_chunk,
+    open_journal,
+    queue_customer_ids,
+    report_makespan,
+    retrieve_campaign_set,
+    stream_campaign_set,
+    store_campaign_sets,
+)
+from .progress import Renderer
+from .scope import Scope
+
+
+class Engine:
+    def __init__(self, concurrency):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def call(self, func, *args):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+async def report_progress(renderer, progress):
+    while True:
+        await asyncio.sleep(renderer.interval)
+        renderer.render(progress)
+
+
+async def with_progress(renderer, progress, coroutine):
+    reporter = asyncio.create_task(report_progress(renderer, progress))
+    try:
+        return await coroutine
+    finally:
+        reporter.cancel()
+        renderer.render(progress, final=True)
+
+
+async def mutate_campaign_set(engine, mutation, size, progress):
+    customer_id = size['customer_id']
+    semaphore = asyncio.Semaphore(mutation.per_customer)
+
+    async def mutate(chunk_index, chunk):
+        async with semaphore:
+            try:
+                count = await engine.call(
+                    mutate_chunk, mutation, customer_id, chunk_index, chunk
+                )
+            except Exception:
+                traceback.print_exc()
+                return
+
+        if mutation.journal:
+            mutation.journal.record(customer_id, chunk_index)
+        progress['campaigns'] += count
+
+    await asyncio.gather(
+        *(
+            mutate(chunk_index, chunk)
+            for chunk_index, chunk in get_chunks(mutation, size)
+        )
+    )
+    progress['customers'] += 1
+
+
+async def retrieve_all(
+    client, args, limiter, customer_ids, previous, scope, progress
+):
+    engine = Engine(args.concurrency)
+
+    async def retrieve(customer_id):
+        try:
+            campaign_set, ids = await engine.call(
+                retrieve_campaign_set,
+                client,
+                limiter,
+                customer_id,
+                previous,
+                scope,
+            )
+        except Exception:
+            traceback.print_exc()
+            print(f'collecting customer {customer_id} failed, skipping it')
+            return None
+        finally:
+            progress['customers'] += 1
+
+        progress['campaigns'] += len(ids)
+        return campaign_set
+
+    try:
+        campaign_sets = await asyncio.gather(*map(retrieve, customer_ids))
+    finally:
+        engine.shutdown()
+
+    return [c for c in campaign_sets if c]
+
+
+async def retrieve_and_pause_all(
+    client, args, customer_ids, previous, scope, mutation, progress
+):
+    engine = Engine(args.concurrency)
+    # A stream waits for the mutations it feeds, so streams run on
+    # threads of their own rather than taking the engine's.
+    streams = ThreadPoolExecutor(max_workers=args.workers)
+    loop = asyncio.get_running_loop()
+
+    async def retrieve_and_pause(customer_id):
+        semaphore = asyncio.Semaphore(mutation.per_customer)
+        # At most this many chunks of the customer wait to be sent.
+        pending = BoundedSemaphore(2 * mutation.per_customer)
+        tasks = []
+
+        async def mutate(chunk_index, chunk):
+            try:
+                async with semaphore:
+                    count = await engine.call(
+                        mutate_chunk, mutation, customer_id, chunk_index, chunk
+                    )
+                progress['campaigns'] += count
+            except Exception:
+                traceback.print_exc()
+            finally:
+                pending.release()
+
+        async def start(chunk_index, chunk):
+            tasks.append(asyncio.create_task(mutate(chunk_index, chunk)))
+
+        def dispatch(chunk_index, chunk):
+            pending.acquire()
+            asyncio.run_coroutine_threadsafe(
+                start(chunk_index, chunk), loop
+            ).result()
+
+        try:
+            campaign_set, count = await loop.run_in_executor(
+                streams,
+                stream_campaign_set,
+                client,
+                mutation.limiter,
+                customer_id,
+                previous,
+                scope,
+                dispatch,
+            )
+        except IncompleteCampaignSet as e:
+            traceback.print_exc()
+            campaign_set = e.campaign_set
+            print(
+                f'collecting customer {customer_id} failed, the {e.count} '
+                f'campaigns of it sent so far are in the campaign sets'
+            )
+        except Exception:
+            traceback.print_exc()
+            campaign_set = None
+            print(
+                f'collecting customer {customer_id} failed before any of '
+                f'its campaigns were sent'
+            )
+
+        # The chunks already dispatched are sent either way.
+        await asyncio.gather(*tasks)
+        progress['customers'] += 1
+        return campaign_set
+
+    try:
+        campaign_sets = await asyncio.gather(
+            *map(retrieve_and_pause, customer_ids)
+        )
+    finally:
+        streams.shutdown(wait=False)
+        engine.shutdown()
+
+    return [c for c in campaign_sets if c]
+
+
+async def mutate_all(args, mutation, sizes, progress):
+    engine = Engine(args.concurrency)
+
+    try:
+        await asyncio.gather(
+            *(
+                mutate_campaign_set(engine, mutation, size, progress)
+                for size in sizes
+            )
+        )
+    finally:
+        engine.shutdown()
+
+
+def collect(client, args):
+    limiter = create_limiter(args)
+    scope = Scope.from_args(args)
+    customer_id_queue, customer_count = queue_customer_ids(
+        client, args, limiter, scope
+    )
+    customer_ids = list(get_all(customer_id_queue))
+    previous = load_since(args, scope)
+    renderer = Renderer(
+        args.progress, 'collect', {'customers': customer_count}
+    )
+    progress = defaultdict(int)
+
+    print('[2/3] getting campaign ids...')
+    campaign_sets = asyncio.run(
+        with_progress(
+            renderer,
+            progress,
+            retrieve_all(
+                client, args, limiter, customer_ids, previous, scope, progress
+            ),
+        )
+    )
+
+    campaign_sets = store_campaign_sets(
+        client, campaign_sets, scope.describe(), args.shard
+    )
+    print(f'[2/3] committed campaign sets {campaign_sets}')
+
+    return campaign_sets
+
+
+def collect_and_pause(client, args, failures):
+    limiter = create_limiter(args)
+    mutation = Mutation(client, args, True, limiter, failures, None)
+    scope = Scope.from_args(args)
+    customer_id_queue, customer_count = queue_customer_ids(
+        client, args, limiter, scope
+    )
+    customer_ids = list(get_all(customer_id_queue))
+    previous = load_since(args, scope)
+    renderer = Renderer(args.progress, 'pause', {'customers': customer_count})
+    progress = defaultdict(int)
+
+    print('[2/3] getting campaign ids and pausing campaigns...')
+    campaign_sets = asyncio.run(
+        with_progress(
+            renderer,
+            progress,
+            retrieve_and_pause_all(
+                client,
+                args,
+                customer_ids,
+                previous,
+                scope,
+                mutation,
+                progress,
+            ),
+        )
+    )
+
+    campaign_sets = store_campaign_sets(
+        client, campaign_sets, scope.describe(), args.shard
+    )
+    print(f'[3/3] committed campaign sets {campaign_sets}')
+
+    return campaign_sets
+
+
+def mutate_campaign_sets(client, args, is_pause, campaign_sets_id, failures):
+    step_num = 1 if args.campaign_sets else 3
+    step = f'[{step_num}/{step_num}]'
+
+    print(f'{step} loading campaign sets {campaign_sets_id}...')
+    journal = open_journal(args, is_pause, campaign_sets_id)
+    sizes = load_campaign_sets_to_send(
+        client, args, is_pause, campaign_sets_id, step
+    )
+    mutation = Mutation(
+        client,
+        args,
+        is_pause,
+        create_limiter(args),
+        failures,
+        journal,
+        load_armed_requests(args, campaign_sets_id, is_pause, sizes, step),
+    )
+    renderer = Renderer(
+        args.progress,
+        'pause' if is_pause else 'unpause',
+        {
+            'customers': len(sizes),
+            'campaigns': count_campaigns(mutation, sizes),
+        },
+    )
+    progress = defaultdict(int)
+
+    # Counted before the journal marks chunks as done.
+    chunk_counts = [len(get_chunk_indexes(mutation, c)) for c in sizes]
+    print(f"{step} {'' if is_pause else 'un'}pausing campaigns...")
+    started = time.monotonic()
+    asyncio.run(
+        with_progress(
+            renderer,
+            progress,
+            mutate_all(args, mutation, sizes, progress),
+        )
+    )
+    seconds = time.monotonic() - started
+    if journal:
+        journal.close()
+    report_makespan(
+        client,
+        args,
+        campaign_sets_id,
+        is_pause,
+        chunk_counts,
+        seconds,
+        step,
+    )
+
+    return sizes
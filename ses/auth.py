@@ -6,9 +6,11 @@ import json
 import hashlib
 import socket
 from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from urllib.parse import unquote
 
-from google_auth_oauthlib.flow import Flow
+from .files import atomic_write
 
 
 app_directory = os.path.join(
@@ -17,10 +19,20 @@ app_directory = os.path.join(
 user_auth_file = os.path.join(app_directory, 'user-auth.json')
 client_auth_file = os.path.join(app_directory, 'client-auth.json')
 api_auth_file = os.path.join(app_directory, 'api-auth.json')
+access_token_file = os.path.join(app_directory, 'access-token.json')
 
-config_files = (user_auth_file, client_auth_file, api_auth_file)
+config_files = (
+    user_auth_file,
+    client_auth_file,
+    api_auth_file,
+    access_token_file,
+)
 
 auth_scope = 'https://www.googleapis.com/auth/adwords'
+token_uri = 'https://accounts.google.com/o/oauth2/token'
+# Cached access tokens this close to expiring are refreshed instead, so
+# they don't run out during a pause.
+access_token_margin = timedelta(minutes=10)
 
 
 class TokenError(Exception):
@@ -135,7 +147,85 @@ def load_user_auth():
         return load_user_auth()
 
 
+def fingerprint(refresh_token):
+    return hashlib.sha256(refresh_token.encode()).hexdigest()
+
+
+def load_access_token(refresh_token):
+    """Returns the cached access token and its expiry, if still good.
+
+    Tokens obtained with another refresh token, e.g. before
+    authenticating again, are not used.
+    """
+    try:
+        with open(access_token_file) as f:
+            cached = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None, None
+
+    if cached.get('refresh_token_sha256') != fingerprint(refresh_token):
+        return None, None
+
+    expiry = datetime.fromtimestamp(cached['expiry'], timezone.utc)
+    if expiry - access_token_margin < datetime.now(timezone.utc):
+        return None, None
+
+    # google-auth works with naive datetimes in UTC.
+    return cached['access_token'], expiry.replace(tzinfo=None)
+
+
+def store_access_token(credentials):
+    # Readable by the user only.
+    with atomic_write(access_token_file, 0o600) as f:
+        json.dump(
+            {
+                'access_token': credentials.token,
+                'expiry': credentials.expiry.replace(
+                    tzinfo=timezone.utc
+                ).timestamp(),
+                'refresh_token_sha256': fingerprint(credentials.refresh_token),
+            },
+            f,
+        )
+
+
+def refresh_access_token(credentials):
+    from google.auth.transport.requests import Request
+
+    credentials.refresh(Request())
+    store_access_token(credentials)
+
+
+def load_credentials(auth):
+    """Returns OAuth credentials, and a future of their refresh if needed.
+
+    The access token cached by an earlier run is used while it is good.
+    Otherwise it is refreshed in the background, so the round trip
+    overlaps with loading the client library.
+    """
+    from google.oauth2.credentials import Credentials
+
+    token, expiry = load_access_token(auth['refresh_token'])
+    credentials = Credentials(
+        token,
+        refresh_token=auth['refresh_token'],
+        token_uri=token_uri,
+        client_id=auth['client_id'],
+        client_secret=auth['client_secret'],
+        expiry=expiry,
+    )
+    if token:
+        return credentials, None
+
+    refreshing = ThreadPoolExecutor(max_workers=1).submit(
+        refresh_access_token, credentials
+    )
+    return credentials, refreshing
+
+
 def oauth_flow():
+    from google_auth_oauthlib.flow import Flow
+
     host = '127.0.0.1'
     port = 14711
     redirect_uri = f'http://{host}:{port}'
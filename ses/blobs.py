@@ -0,0 +1,249 @@
+"""Content-addressed blob storage.
+
+Blobs are named by the sha1 of their canonical JSON, as they always
+were, but are appended to a single pack file instead of getting a file
+each. An index of fixed-size records maps every hash to the kind, offset
+and length of its data and the time it was stored. Campaign sets are
+packed as int64 arrays rather than JSON, and reads are served from a
+memory map of the pack.
+
+Hashes of blobs from before the pack existed still resolve to their
+one-file-per-blob JSON.
+"""
+
+import fcntl
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from array import array
+from functools import partial
+from hashlib import sha1
+from struct import Struct
+
+JSON, RAW, CAMPAIGN_SET = range(3)
+
+# sha1, kind, offset, length, stored at
+index_record = Struct('<20sBQQd')
+# Campaign sets are the customer id followed by the campaign ids, in
+# native byte order as the cache never leaves the machine.
+customer_id_field = Struct('=q')
+
+
+def canonical_json(obj):
+    return json.dumps(obj, sort_keys=True).encode('utf-8')
+
+
+class BlobStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self.pack_path = os.path.join(directory, 'pack')
+        self.index_path = os.path.join(directory, 'pack.idx')
+        self.lock = threading.Lock()
+        self.index = {}
+        self.index_size = 0
+        self.map = None
+
+    def read_index(self):
+        # Picks up the records appended since the last read, including
+        # those of other processes. A torn last record is left for later.
+        try:
+            with open(self.index_path, 'rb') as f:
+                f.seek(self.index_size)
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        data = data[: len(data) - len(data) % index_record.size]
+        for digest, *entry in index_record.iter_unpack(data):
+            self.index[digest.hex()] = entry
+        self.index_size += len(data)
+
+    def find(self, sha1_hash):
+        entry = self.index.get(sha1_hash)
+        if entry is None:
+            with self.lock:
+                self.read_index()
+            entry = self.index.get(sha1_hash)
+
+        return entry
+
+    def read(self, offset, length):
+        with self.lock:
+            if self.map is None or offset + length > len(self.map):
+                with open(self.pack_path, 'rb') as f:
+                    self.map = mmap.mmap(
+                        f.fileno(), 0, access=mmap.ACCESS_READ
+                    )
+
+            return self.map[offset : offset + length]  # noqa: E203
+
+    def store(self, sha1_hash, kind, data):
+        return self.append(sha1_hash, kind, lambda pack: pack.write(data))
+
+    def append(self, sha1_hash, kind, write):
+        """Stores what `write` writes to the pack, unless already there."""
+        if sha1_hash in self.index:
+            return sha1_hash
+
+        with self.lock, open(self.index_path, 'ab') as index:
+            # Other processes may append to the same pack.
+            fcntl.flock(index, fcntl.LOCK_EX)
+            self.read_index()
+            if sha1_hash in self.index:
+                return sha1_hash
+
+            # Drop a record torn by a process that died writing it.
+            index.truncate(self.index_size)
+            with open(self.pack_path, 'ab') as pack:
+                offset = pack.seek(0, os.SEEK_END)
+                write(pack)
+                length = pack.tell() - offset
+
+            entry = [kind, offset, length, time.time()]
+            index.write(index_record.pack(bytes.fromhex(sha1_hash), *entry))
+            index.flush()
+            self.index[sha1_hash] = entry
+            self.index_size += index_record.size
+
+        return sha1_hash
+
+    def legacy_path(self, sha1_hash):
+        return os.path.join(self.directory, sha1_hash)
+
+    def read_blob(self, sha1_hash):
+        entry = self.find(sha1_hash)
+        if entry is None:
+            with open(self.legacy_path(sha1_hash), 'rb') as f:
+                return JSON, f.read()
+
+        kind, offset, length, stored_at = entry
+        return kind, self.read(offset, length)
+
+    def load_raw(self, sha1_hash):
+        return self.read_blob(sha1_hash)[1]
+
+    def load(self, sha1_hash):
+        kind, data = self.read_blob(sha1_hash)
+        if kind != CAMPAIGN_SET:
+            return json.loads(data)
+
+        (customer_id,) = customer_id_field.unpack_from(data)
+        campaign_ids = array('q')
+        campaign_ids.frombytes(data[customer_id_field.size :])  # noqa: E203
+
+        return {
+            'customer_id': customer_id,
+            'campaign_ids': campaign_ids.tolist(),
+        }
+
+    def campaign_set_size(self, sha1_hash):
+        """Returns a campaign set's customer id and number of campaigns."""
+        entry = self.find(sha1_hash)
+        if entry is None or entry[0] != CAMPAIGN_SET:
+            campaign_set = self.load(sha1_hash)
+            return campaign_set['customer_id'], len(
+                campaign_set['campaign_ids']
+            )
+
+        kind, offset, length, stored_at = entry
+        (customer_id,) = customer_id_field.unpack(
+            self.read(offset, customer_id_field.size)
+        )
+        return customer_id, length // customer_id_field.size - 1
+
+    def stored_at(self, sha1_hash):
+        entry = self.find(sha1_hash)
+        if entry is None:
+            return os.path.getmtime(self.legacy_path(sha1_hash))
+
+        return entry[3]
+
+    def store_json(self, obj):
+        data = canonical_json(obj)
+        return self.store(sha1(data).hexdigest(), JSON, data)
+
+    def store_raw(self, data):
+        return self.store(sha1(data).hexdigest(), RAW, data)
+
+    def store_campaign_set(self, customer_id, campaign_ids):
+        """Stores a customer's sorted campaign ids.
+
+        The hash is that of the JSON blob campaign sets used to be, so
+        unchanged campaign sets keep their hash.
+        """
+        sha1_hash = sha1(
+            canonical_json(
+                {'customer_id': customer_id, 'campaign_ids': campaign_ids}
+            )
+        ).hexdigest()
+        if sha1_hash in self.index:
+            return sha1_hash
+
+        data = (
+            customer_id_field.pack(customer_id)
+            + array('q', campaign_ids).tobytes()
+        )
+
+        return self.store(sha1_hash, CAMPAIGN_SET, data)
+
+    def campaign_set_writer(self, customer_id):
+        return CampaignSetWriter(self, customer_id)
+
+    def store_file(self, obj):
+        """Stores `obj` as a JSON file of its own, for people to read."""
+        data = canonical_json(obj)
+        sha1_hash = sha1(data).hexdigest()
+        with open(self.legacy_path(sha1_hash), 'wb') as f:
+            f.write(data)
+
+        return sha1_hash
+
+
+class CampaignSetWriter:
+    """Stores a campaign set whose campaign ids arrive one by one.
+
+    The ids have to arrive in ascending order, which lets the hash of the
+    campaign set's JSON be computed as they come in. They are spooled to
+    a temporary file, so memory use doesn't grow with the campaign set.
+    """
+
+    buffer_size = 8192
+
+    def __init__(self, store, customer_id):
+        self.store = store
+        self.customer_id = customer_id
+        self.count = 0
+        self.sha1 = sha1(b'{"campaign_ids": [')
+        self.buffer = array('q')
+        self.spool = tempfile.TemporaryFile(dir=store.directory)
+        self.spool.write(customer_id_field.pack(customer_id))
+
+    def add(self, campaign_id):
+        self.sha1.update(b'%s%d' % (b', ' if self.count else b'', campaign_id))
+        self.count += 1
+        self.buffer.append(campaign_id)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.spool.write(self.buffer.tobytes())
+        del self.buffer[:]
+
+    def commit(self):
+        """Stores the campaign set and returns its hash."""
+        self.flush()
+        self.sha1.update(b'], "customer_id": %d}' % self.customer_id)
+        self.spool.seek(0)
+
+        return self.store.append(
+            self.sha1.hexdigest(),
+            CAMPAIGN_SET,
+            partial(shutil.copyfileobj, self.spool),
+        )
+
+    def close(self):
+        self.spool.close()
@@ -0,0 +1,46 @@
+class RequestBuilder:
+    """Builds the MutateCampaignsRequests of one pause or unpause run.
+
+    Message types, the target status and the update mask are resolved
+    once. Every operation is then a copy of a prebuilt template with only
+    the resource name filled in, which is much cheaper than assembling
+    each one field by field.
+    """
+
+    def __init__(self, client, is_pause, no_dry_run, partial_failure):
+        self.request_type = type(
+            client.get_type('MutateCampaignsRequest', version='v19')
+        )
+        enum = client.get_type('CampaignStatusEnum', version='v19')
+
+        self.template = client.get_type('CampaignOperation', version='v19')
+        self.template.update.status = enum.PAUSED if is_pause else enum.ENABLED
+        self.template.update_mask.paths.append('status')
+
+        self.validate_only = not no_dry_run
+        self.partial_failure = partial_failure
+
+    def build(self, customer_id, campaign_ids):
+        request = self.request_type(
+            customer_id=str(customer_id),
+            validate_only=self.validate_only,
+            partial_failure=self.partial_failure,
+        )
+
+        template = self.template
+        prefix = f'customers/{customer_id}/campaigns/'
+        add = request.operations.add
+        for campaign_id in campaign_ids:
+            operation = add()
+            operation.CopyFrom(template)
+            operation.update.resource_name = prefix + str(campaign_id)
+
+        return request
+
+    def parse(self, data):
+        """Returns a request serialized by an earlier build()."""
+        request = self.request_type.FromString(data)
+        request.validate_only = self.validate_only
+        request.partial_failure = self.partial_failure
+
+        return request
@@ -0,0 +1,202 @@
+"""Catalog of collected campaign sets and what was done with them.
+
+An append-only file of JSON lines in the cache directory. Finding the
+latest snapshot, or the one last paused, is a read of this file rather
+than a walk through the blobs or scrolling back through terminal output.
+"""
+
+import json
+import time
+from statistics import median
+from threading import Lock
+
+# Earlier runs the time per round trip is taken from.
+recent_runs = 5
+
+
+class Catalog:
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+
+    def append(self, entry):
+        with self.lock, open(self.path, 'a') as f:
+            f.write(json.dumps(entry, sort_keys=True) + '\n')
+
+    def entries(self):
+        try:
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return
+
+        for line in lines:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Cut short by a run that died writing it.
+                continue
+
+    def record_snapshot(
+        self,
+        campaign_sets_id,
+        login_customer_id,
+        campaign_counts,
+        scope=None,
+        shard=None,
+    ):
+        entry = {
+            'type': 'snapshot',
+            'campaign_sets': campaign_sets_id,
+            'login_customer_id': str(login_customer_id),
+            'time': time.time(),
+            'customers': len(campaign_counts),
+            'campaigns': {
+                str(customer_id): count
+                for customer_id, count in campaign_counts.items()
+            },
+        }
+        if scope:
+            entry['scope'] = scope
+        if shard:
+            entry['shard'] = shard
+        self.append(entry)
+
+    def record_operation(self, campaign_sets_id, login_customer_id, operation):
+        self.append(
+            {
+                'type': 'operation',
+                'campaign_sets': campaign_sets_id,
+                'login_customer_id': str(login_customer_id),
+                'time': time.time(),
+                'operation': operation,
+            }
+        )
+
+    def find(self, login_customer_id, type):
+        return [
+            entry
+            for entry in self.entries()
+            if entry['type'] == type
+            and entry['login_customer_id'] == str(login_customer_id)
+        ]
+
+    def latest(self, login_customer_id, scope=None):
+        """Returns the id of the latest snapshot collected with `scope`, as
+        described by Scope.describe(), None if there is none.
+
+        The snapshot of a shard only covers part of the customers, so it
+        counts once merged.
+        """
+        snapshots = [
+            entry
+            for entry in self.find(login_customer_id, 'snapshot')
+            if entry.get('scope', {}) == (scope or {}) and 'shard' not in entry
+        ]
+        return snapshots[-1]['campaign_sets'] if snapshots else None
+
+    def last_paused(self, login_customer_id):
+        """Returns the id of the last paused snapshot not unpaused since."""
+        last_operations = {}
+        for entry in self.find(login_customer_id, 'operation'):
+            # Re-inserting moves the snapshot to the end.
+            last_operations.pop(entry['campaign_sets'], None)
+            last_operations[entry['campaign_sets']] = entry['operation']
+
+        paused = [
+            campaign_sets_id
+            for campaign_sets_id, operation in last_operations.items()
+            if operation == 'pause'
+        ]
+        return paused[-1] if paused else None
+
+    def is_paused(self, login_customer_id, campaign_sets_id):
+        """Returns whether the campaign sets were paused and not unpaused
+        since."""
+        operations = [
+            entry['operation']
+            for entry in self.find(login_customer_id, 'operation')
+            if entry['campaign_sets'] == campaign_sets_id
+        ]
+        return bool(operations) and operations[-1] == 'pause'
+
+    def paused_at(self, login_customer_id, campaign_sets_id):
+        """Returns when the campaign sets were last paused, None if never."""
+        paused = [
+            entry['time']
+            for entry in self.find(login_customer_id, 'operation')
+            if entry['campaign_sets'] == campaign_sets_id
+            and entry['operation'] == 'pause'
+        ]
+        return paused[-1] if paused else None
+
+    def record_timing(
+        self,
+        campaign_sets_id,
+        login_customer_id,
+        operation,
+        engine,
+        workers,
+        per_customer,
+        requests,
+        round_trips,
+        seconds,
+    ):
+        """Records how long the requests of a pause or unpause took, and
+        the round trips they were predicted to take."""
+        self.append(
+            {
+                'type': 'timing',
+                'campaign_sets': campaign_sets_id,
+                'login_customer_id': str(login_customer_id),
+                'time': time.time(),
+                'operation': operation,
+                'engine': engine,
+                'workers': workers,
+                'per_customer': per_customer,
+                'requests': requests,
+                'round_trips': round_trips,
+                'seconds': seconds,
+            }
+        )
+
+    def seconds_per_round_trip(self, login_customer_id, engine, workers):
+        """Returns the median seconds per round trip of recent runs, None if
+        there are none, and whether they had as many workers.
+
+        Runs with as many workers are preferred, since throttling depends on
+        how many requests are in flight.
+        """
+        timings = [
+            entry
+            for entry in self.find(login_customer_id, 'timing')
+            if entry['engine'] == engine and entry['round_trips']
+        ]
+        same_workers = [t for t in timings if t['workers'] == workers]
+        timings = (same_workers or timings)[-recent_runs:]
+        if not timings:
+            return None, False
+
+        return (
+            median(t['seconds'] / t['round_trips'] for t in timings),
+            bool(same_workers),
+        )
+
+    def snapshot(self, campaign_sets_id):
+        """Returns the latest entry of a snapshot, None if there is none."""
+        snapshots = [
+            entry
+            for entry in self.entries()
+            if entry['type'] == 'snapshot'
+            and entry['campaign_sets'] == campaign_sets_id
+        ]
+        return snapshots[-1] if snapshots else None
+
+    def scope(self, campaign_sets_id):
+        """Returns the scope the campaign sets were collected with.
+
+        Empty for an emergency stop of everything, and for campaign sets
+        not in the catalog.
+        """
+        snapshot = self.snapshot(campaign_sets_id)
+        return snapshot.get('scope', {}) if snapshot else {}
@@ -0,0 +1,56 @@
+"""Customer discovery and its cache.
+
+Discovery lists every enabled account under the login customer. Manager
+accounts and test accounts never have campaigns to pause, so only the
+others are worked on. The hierarchy is kept in the cache directory, so
+runs shortly after one another don't need to ask for it again.
+"""
+
+import json
+import time
+
+from .files import atomic_write
+
+
+def serving_customer_ids(clients):
+    """Returns the accounts that can have campaigns, each once."""
+    seen = set()
+    customer_ids = []
+    for client in clients:
+        customer_id = client['customer_id']
+        if client['manager'] or client['test_account'] or customer_id in seen:
+            continue
+        seen.add(customer_id)
+        customer_ids.append(customer_id)
+
+    return customer_ids
+
+
+class CustomerCache:
+    def __init__(self, path):
+        self.path = path
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def load(self, login_customer_id, max_age):
+        """Returns the cached clients, None if there are none this fresh."""
+        entry = self.read().get(str(login_customer_id))
+        if not entry or time.time() - entry['time'] > max_age:
+            return None
+
+        return entry['clients']
+
+    def store(self, login_customer_id, clients):
+        hierarchies = self.read()
+        hierarchies[str(login_customer_id)] = {
+            'time': time.time(),
+            'clients': clients,
+        }
+
+        with atomic_write(self.path) as f:
+            json.dump(hierarchies, f, sort_keys=True)
@@ -0,0 +1,27 @@
+"""Files replaced as a whole.
+
+Written to the side and renamed, so readers never see half a file and a
+run that dies halfway leaves the previous one in place.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode=0o666):
+    """Opens a file for writing that replaces `path` once closed.
+
+    `mode` is the permissions the file is created with, less the umask.
+    """
+    # Processes and threads of one process may write the same file.
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    try:
+        with os.fdopen(fd, 'w') as f:
+            yield f
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
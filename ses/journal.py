@@ -0,0 +1,41 @@
+import os
+import threading
+
+
+class Journal:
+    """Append-only record of the chunks a pause or unpause has sent.
+
+    Each line is "<customer id> <chunk index>", written once the chunk's
+    mutate request has gone through. Resuming a run reads the lines back
+    and skips those chunks.
+    """
+
+    def __init__(self, path, resume):
+        self.path = path
+        self.completed = set()
+        self.lock = threading.Lock()
+
+        if resume and os.path.exists(path):
+            with open(path, 'r+') as f:
+                data = f.read()
+                # The last line may be cut short if we died while writing
+                # it, drop it so appending starts on a fresh line.
+                complete = data[: data.rfind('\n') + 1]
+                for line in complete.splitlines():
+                    customer_id, chunk_index = map(int, line.split())
+                    self.completed.add((customer_id, chunk_index))
+                f.truncate(len(complete))
+
+        self.file = open(path, 'a' if resume else 'w')
+
+    def is_done(self, customer_id, chunk_index):
+        return (customer_id, chunk_index) in self.completed
+
+    def record(self, customer_id, chunk_index):
+        with self.lock:
+            self.completed.add((customer_id, chunk_index))
+            self.file.write(f'{customer_id} {chunk_index}\n')
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
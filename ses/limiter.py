@@ -0,0 +1,129 @@
+"""Adaptive concurrency for API calls.
+
+An AIMD (additive increase, multiplicative decrease) limit on the number
+of calls in flight: every successful call nudges the limit up by roughly
+one per "window" of calls, every quota or transient error halves it and
+the failed call is retried after a jittered exponential backoff.
+"""
+
+import random
+import threading
+import time
+
+# gRPC status codes worth retrying: quota exhaustion and transient
+# server-side or network failures.
+retryable_codes = frozenset(
+    (
+        'RESOURCE_EXHAUSTED',
+        'UNAVAILABLE',
+        'DEADLINE_EXCEEDED',
+        'ABORTED',
+        'INTERNAL',
+    )
+)
+
+
+def status_code(exception):
+    # The client library raises RESOURCE_EXHAUSTED and INTERNAL as
+    # google.api_core exceptions, whose `code` is the HTTP status.
+    code = getattr(exception, 'grpc_status_code', None)
+    if code is None:
+        # GoogleAdsException keeps the failed grpc.Call in `error`, plain
+        # grpc.RpcErrors are calls themselves.
+        call = getattr(exception, 'error', exception)
+        code = getattr(call, 'code', None)
+        if callable(code):
+            code = code()
+
+    return getattr(code, 'name', None)
+
+
+def is_retryable(exception):
+    return status_code(exception) in retryable_codes
+
+
+# Which attempt at an API call the current thread is making, 0 for the
+# first one.
+attempts = threading.local()
+
+
+def current_attempt():
+    return getattr(attempts, 'attempt', 0)
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        max_limit,
+        min_limit=1,
+        max_retries=8,
+        base_delay=1.0,
+        max_delay=60.0,
+        verbose=False,
+    ):
+        self.limit = float(max_limit)
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.verbose = verbose
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, succeeded):
+        # `succeeded` is None for errors that say nothing about load.
+        with self.condition:
+            self.in_flight -= 1
+            if succeeded:
+                self.limit = min(
+                    self.max_limit, self.limit + 1 / max(self.limit, 1)
+                )
+            elif succeeded is not None and (
+                time.monotonic() - self.last_decrease > self.base_delay
+            ):
+                # Calls that were already in flight when the API pushed
+                # back tend to fail together; only count that once.
+                self.limit = max(self.min_limit, self.limit / 2)
+                self.last_decrease = time.monotonic()
+            self.condition.notify_all()
+
+    def backoff(self, attempt):
+        return random.uniform(
+            0, min(self.max_delay, self.base_delay * 2**attempt)
+        )
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            self.acquire()
+            attempts.attempt = attempt
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_retryable(e)
+                self.release(succeeded=False if throttled else None)
+                if not throttled or attempt >= self.max_retries:
+                    raise
+
+                delay = self.backoff(attempt)
+                name = getattr(func, '__name__', 'API call')
+                if self.verbose:
+                    print(
+                        f'{status_code(e)} from {name}, retrying '
+                        f'in {delay:.1f}s (limit {int(self.limit)})'
+                    )
+                time.sleep(delay)
+                attempt += 1
+            else:
+                self.release(succeeded=True)
+                return result
+            finally:
+                attempts.attempt = 0
@@ -1,27 +1,72 @@
-import re
 import os
 import json
+import multiprocessing
 import sys
+import time
 import traceback
-from hashlib import sha1
+from datetime import datetime, timezone
 from queue import Queue, Empty
-from threading import Thread
+from functools import partial
+from threading import BoundedSemaphore, Lock, Thread
 from itertools import zip_longest
-from argparse import ArgumentParser, RawDescriptionHelpFormatter
+from argparse import (
+    ArgumentParser,
+    ArgumentTypeError,
+    Namespace,
+    RawDescriptionHelpFormatter,
+)
 from collections import defaultdict
-
-from google.ads.googleads.client import GoogleAdsClient
-from google.api_core import protobuf_helpers
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from .banner import banner
-from .auth import load_user_auth, load_organization_auth
+from .blobs import BlobStore
+from .catalog import Catalog
+from .customers import CustomerCache, serving_customer_ids
+from .files import atomic_write
+from .builder import RequestBuilder
+from .auth import load_credentials, load_user_auth, load_organization_auth
+from .journal import Journal
+from .limiter import AdaptiveLimiter, is_retryable
+from .progress import Renderer, emit, use_jsonl
+from .scope import Scope, channel_type
+from .services import WarmClient
+from .queries import (
+    collect_campaign_ids,
+    collect_campaign_ids_changed_after,
+    collect_campaign_ids_in_status,
+    collect_campaign_ids_since,
+    collect_customer_clients,
+    stream_campaign_ids,
+)
+from .schedule import (
+    count_chunks,
+    interleave,
+    largest_first,
+    predict_makespan,
+)
 
 cache_directory = os.path.join(
     os.getenv('HOME'), '.cache', 'sem-emergency-stop'
 )
 
 blob_directory = os.path.join(cache_directory, 'blobs')
-match_customer_id = re.compile(r'^customers/\d+/customerClients/(\d+)$').match
+journal_directory = os.path.join(cache_directory, 'journals')
+armed_directory = os.path.join(cache_directory, 'armed')
+blob_store = BlobStore(blob_directory)
+catalog = Catalog(os.path.join(cache_directory, 'catalog.jsonl'))
+customer_cache = CustomerCache(os.path.join(cache_directory, 'customers.json'))
+standby_socket = os.path.join(cache_directory, 'standby.sock')
+chunk_size = 1000
+# Seconds collect and standby reuse the customer ids found by a run.
+customers_max_age = 3600
+# Seconds between writes of --metrics-file during a run.
+metrics_interval = 15
+
+# Kinds of per-operation errors in a partial failure that are worth
+# sending again.
+retryable_errors = frozenset(
+    ('quota_error', 'internal_error', 'database_error')
+)
 
 
 def grouper(iterable, n, fillvalue=None):
@@ -30,33 +75,8 @@ def grouper(iterable, n, fillvalue=None):
     return zip_longest(*args, fillvalue=fillvalue)
 
 
-def parse_customer_id(resource_name):
-    return int(match_customer_id(resource_name).group(1))
-
-
-def query(service, customer_id, query):
-    return service.search_stream(customer_id=str(customer_id), query=query)
-
-
-def collect_customer_ids(client):
-    service = client.get_service('GoogleAdsService', version='v19')
-    return [
-        parse_customer_id(row.customer_client.resource_name)
-        for response in query(
-            service,
-            client.login_customer_id,
-            """
-                SELECT customer.id
-                FROM customer_client
-                WHERE customer_client.status = 'ENABLED'""",
-        )
-        for row in response.results
-    ]
-
-
 def load_blob(sha1_hash):
-    with open(os.path.join(blob_directory, sha1_hash), 'rb') as f:
-        return json.load(f)
+    return blob_store.load(sha1_hash)
 
 
 def load_campaign_sets(sha1_hash):
@@ -64,53 +84,206 @@ def load_campaign_sets(sha1_hash):
 
 
 def store_blob(obj):
-    data = json.dumps(obj, sort_keys=True).encode('utf-8')
-    sha1_hash = sha1(data).hexdigest()
-    with open(os.path.join(blob_directory, sha1_hash), 'wb') as f:
-        f.write(data)
+    return blob_store.store_json(obj)
+
 
-    return sha1_hash
+def load_raw_blob(sha1_hash):
+    return blob_store.load_raw(sha1_hash)
+
+
+def store_raw_blob(data):
+    return blob_store.store_raw(data)
 
 
 def store_customer_campaign_set(customer_id, campaign_ids):
-    return store_blob(
-        {
-            'customer_id': customer_id,
-            'campaign_ids': sorted(campaign_ids),
-        }
+    return blob_store.store_campaign_set(customer_id, sorted(campaign_ids))
+
+
+def store_campaign_sets(client, campaign_sets, scope=None, shard=None):
+    """Stores the campaign sets of a snapshot, `scope` as described by
+    Scope.describe(), `shard` as given with --shard."""
+    campaign_sets = sorted(campaign_sets)
+    campaign_sets_id = store_blob({'campaign_sets': campaign_sets})
+    catalog.record_snapshot(
+        campaign_sets_id,
+        client.login_customer_id,
+        dict(map(blob_store.campaign_set_size, campaign_sets)),
+        scope,
+        shard and format_shard(shard),
+    )
+    emit(
+        'committed',
+        campaign_sets=campaign_sets_id,
+        shard=shard and format_shard(shard),
     )
 
+    return campaign_sets_id
 
-def store_campaign_sets(campaign_sets):
-    return store_blob(
-        {
-            'campaign_sets': sorted(campaign_sets),
-        }
-    )
 
+def load_previous_snapshot(campaign_sets_id):
+    """Returns when a snapshot was taken and its campaign sets by customer."""
+    taken_at = datetime.fromtimestamp(blob_store.stored_at(campaign_sets_id))
+    campaign_sets = {}
+    for sha1_hash in load_campaign_sets(campaign_sets_id):
+        campaign_set = load_blob(sha1_hash)
+        campaign_sets[campaign_set['customer_id']] = (
+            sha1_hash,
+            campaign_set['campaign_ids'],
+        )
+
+    return taken_at, campaign_sets
 
-def collect_campaign_ids(client, customer_id):
-    service = client.get_service('GoogleAdsService', version='v19')
-    return [
-        row.campaign.id
-        for response in query(
-            service,
+
+def load_since(args, scope):
+    if not args.since:
+        return None
+
+    # Campaigns out of the previous scope would never be looked at.
+    if catalog.scope(args.since) != scope.describe():
+        print(f'{args.since} was not collected with the same scope')
+        sys.exit(-1)
+    if not scope.follows_changes():
+        print(
+            '[2/3] looking at all campaigns, changes to labels and geo '
+            'targets are not tracked'
+        )
+        return None
+
+    print(f'[2/3] only looking at changes since {args.since}')
+    return load_previous_snapshot(args.since)
+
+
+def retrieve_campaign_set(client, limiter, customer_id, previous, scope):
+    """Returns a customer's campaign set hash and campaign ids.
+
+    With a previous snapshot, only the campaigns changed since are looked
+    at; the customer is rescanned in full if that is not possible.
+    """
+    conditions = limiter.call(scope.conditions, client, customer_id)
+    if conditions is None:
+        return store_customer_campaign_set(customer_id, []), []
+
+    if previous and customer_id in previous[1]:
+        taken_at, campaign_sets = previous
+        sha1_hash, campaign_ids = campaign_sets[customer_id]
+        ids = limiter.call(
+            collect_campaign_ids_since,
+            client,
             customer_id,
-            """
-                SELECT campaign.id
-                FROM campaign
-                WHERE
-                campaign.status = 'ENABLED'
-                AND campaign.experiment_type = 'BASE'
-                AND campaign.advertising_channel_type != 'VIDEO'
-                AND campaign.advertising_channel_type != 'LOCAL'""",
+            taken_at,
+            campaign_ids,
+            conditions,
         )
-        for row in response.results
-    ]
+        if ids == campaign_ids:
+            return sha1_hash, campaign_ids
+        if ids is not None:
+            return store_customer_campaign_set(customer_id, ids), ids
 
+    ids = limiter.call(collect_campaign_ids, client, customer_id, conditions)
+    return store_customer_campaign_set(customer_id, ids), ids
 
-def retrieve_campaign_ids(
-    client, verbose, customer_ids, campaign_sets, progress_queue
+
+class IncompleteCampaignSet(Exception):
+    """Collecting a customer failed after some chunks were dispatched.
+
+    `campaign_set` is the hash of a campaign set of the dispatched
+    campaigns, so they can be unpaused like the others.
+    """
+
+    def __init__(self, customer_id, campaign_set, count):
+        super().__init__(
+            f'collecting customer {customer_id} failed after {count} '
+            f'campaigns were dispatched'
+        )
+        self.campaign_set = campaign_set
+        self.count = count
+
+
+def stream_campaign_set(
+    client, limiter, customer_id, previous, scope, dispatch
+):
+    """Collects a customer's campaigns, dispatching chunks as they fill.
+
+    Campaign ids come in ordered, so the campaign set's hash is worked
+    out on the way and only the chunk being filled is held in memory.
+    Returns the campaign set's hash and number of campaigns. Raises
+    IncompleteCampaignSet if it fails after dispatching some.
+    """
+    if previous and customer_id in previous[1]:
+        sha1_hash, ids = retrieve_campaign_set(
+            client, limiter, customer_id, previous, scope
+        )
+        for chunk_index, chunk in enumerate(grouper(ids, chunk_size)):
+            dispatch(chunk_index, [i for i in chunk if i])
+        return sha1_hash, len(ids)
+
+    conditions = limiter.call(scope.conditions, client, customer_id)
+    if conditions is None:
+        return store_customer_campaign_set(customer_id, []), 0
+
+    # What was dispatched is kept track of too, for a campaign set that
+    # covers it should the stream fail for good.
+    dispatched = blob_store.campaign_set_writer(customer_id)
+    sent_up_to = -1
+    chunk_index = 0
+
+    def send(chunk):
+        nonlocal sent_up_to, chunk_index
+        for campaign_id in chunk:
+            dispatched.add(campaign_id)
+        dispatch(chunk_index, chunk)
+        sent_up_to = chunk[-1]
+        chunk_index += 1
+
+    # Not a limiter call: the stream waits for the mutations it feeds,
+    # which need the limiter themselves.
+    attempt = 0
+    try:
+        while True:
+            writer = blob_store.campaign_set_writer(customer_id)
+            try:
+                chunk = []
+                for campaign_id in stream_campaign_ids(
+                    client, customer_id, conditions
+                ):
+                    writer.add(campaign_id)
+                    # A retry reads from the start again.
+                    if campaign_id <= sent_up_to:
+                        continue
+                    chunk.append(campaign_id)
+                    if len(chunk) == chunk_size:
+                        send(chunk)
+                        chunk = []
+                if chunk:
+                    send(chunk)
+
+                return writer.commit(), writer.count
+            except Exception as e:
+                if not is_retryable(e) or attempt >= limiter.max_retries:
+                    if not dispatched.count:
+                        raise
+                    raise IncompleteCampaignSet(
+                        customer_id, dispatched.commit(), dispatched.count
+                    ) from e
+            finally:
+                writer.close()
+
+            time.sleep(limiter.backoff(attempt))
+            attempt += 1
+    finally:
+        dispatched.close()
+
+
+def stream_and_queue(
+    client,
+    limiter,
+    mutation,
+    previous,
+    scope,
+    customer_ids,
+    campaign_sets,
+    chunk_queue,
+    progress_queue,
 ):
     while True:
         try:
@@ -118,90 +291,262 @@ def retrieve_campaign_ids(
         except Empty:
             return
 
-        ids = collect_campaign_ids(client, customer_id)
-        campaign_set = store_customer_campaign_set(customer_id, ids)
-        campaign_sets.put(campaign_set)
-        progress_queue.put_nowait(('customers', 1))
-        progress_queue.put_nowait(('campaigns', len(ids)))
-        customer_ids.task_done()
+        # The stream counts as one more chunk until it ends.
+        customer = CustomerChunks(customer_id, 1, mutation.per_customer)
 
+        def dispatch(chunk_index, chunk):
+            customer.add()
+            chunk_queue.put((customer, chunk_index, chunk))
 
-def get_operation(client, service, customer_id, campaign_id, is_pause):
-    operation = client.get_type('CampaignOperation', version='v19')
-    campaign = operation.update
-    campaign.resource_name = service.campaign_path(customer_id, campaign_id)
-    enum = client.get_type('CampaignStatusEnum', version='v19')
-    campaign.status = enum.PAUSED if is_pause else enum.ENABLED
-    operation.update_mask.CopyFrom(protobuf_helpers.field_mask(None, campaign))
+        try:
+            campaign_set, count = stream_campaign_set(
+                client, limiter, customer_id, previous, scope, dispatch
+            )
+            campaign_sets.put(campaign_set)
+        except IncompleteCampaignSet as e:
+            traceback.print_exc()
+            campaign_sets.put(e.campaign_set)
+            print(
+                f'collecting customer {customer_id} failed, the {e.count} '
+                f'campaigns of it sent so far are in the campaign sets'
+            )
+        except Exception:
+            traceback.print_exc()
+            print(
+                f'collecting customer {customer_id} failed before any of '
+                f'its campaigns were sent'
+            )
 
-    return operation
+        if customer.chunk_done():
+            progress_queue.put(('customers', 1))
+        customer_ids.task_done()
 
 
-def mutate_campaigns(
+def retrieve_campaign_ids(
     client,
-    service,
-    sha1_hash,
+    limiter,
+    previous,
+    scope,
     verbose,
-    no_dry_run,
-    is_pause,
-    campaign_set_queue,
+    customer_ids,
+    campaign_sets,
     progress_queue,
 ):
-    campaign_set = load_blob(sha1_hash)
-    customer_id = campaign_set['customer_id']
-    campaign_ids = campaign_set['campaign_ids']
-    if not campaign_ids:
-        progress_queue.put(('customers', 1))
-        return
+    while True:
+        try:
+            customer_id = customer_ids.get_nowait()
+        except Empty:
+            return
 
-    for chunk in grouper(campaign_ids, 1000):
-        request = client.get_type('MutateCampaignsRequest')
-        request.customer_id = str(customer_id)
-        request.validate_only = not no_dry_run
+        try:
+            campaign_set, ids = retrieve_campaign_set(
+                client, limiter, customer_id, previous, scope
+            )
+            campaign_sets.put(campaign_set)
+            progress_queue.put_nowait(('campaigns', len(ids)))
+        except Exception:
+            traceback.print_exc()
+            print(f'collecting customer {customer_id} failed, skipping it')
+        finally:
+            progress_queue.put_nowait(('customers', 1))
+            customer_ids.task_done()
+
+
+def get_error_name(error_code):
+    kind = error_code.WhichOneof('error_code')
+    field = error_code.DESCRIPTOR.fields_by_name[kind]
+    value = field.enum_type.values_by_number[getattr(error_code, kind)]
+    return f'{kind}.{value.name}'
+
+
+def get_partial_failures(client, response):
+    """Returns a dict of operation index to a list of (name, message)."""
+    if not response.partial_failure_error.code:
+        return {}
+
+    failure_type = type(client.get_type('GoogleAdsFailure', version='v19'))
+    failures = defaultdict(list)
+    for detail in response.partial_failure_error.details:
+        failure = failure_type.FromString(detail.value)
+        for error in failure.errors:
+            index = error.location.field_path_elements[0].index
+            failures[index].append(
+                (get_error_name(error.error_code), error.message)
+            )
 
-        for campaign_id in chunk:
-            if campaign_id:
-                request.operations.append(
-                    get_operation(
-                        client, service, customer_id, campaign_id, is_pause
-                    )
-                )
+    return failures
 
-        service.mutate_campaigns(request)
 
-        progress_queue.put(('campaigns', len(request.operations)))
+def is_retryable_failure(errors):
+    return all(
+        name.split('.')[0] in retryable_errors for name, message in errors
+    )
 
-    progress_queue.put(('customers', 1))
 
+class Mutation:
+    """Everything the workers of one pause or unpause run share."""
+
+    def __init__(
+        self, client, args, is_pause, limiter, failures, journal, armed=None
+    ):
+        self.client = client
+        self.service = client.get_service('CampaignService', version='v19')
+        self.limiter = limiter
+        self.builder = RequestBuilder(
+            client, is_pause, args.no_dry_run, args.partial_failure
+        )
+        self.per_customer = args.per_customer
+        self.failures = failures
+        self.journal = journal
+        self.armed = armed or {}
+
+    def build_request(self, customer_id, chunk_index, campaign_ids):
+        armed = self.armed.get(customer_id)
+        if armed:
+            return self.builder.parse(load_raw_blob(armed[chunk_index]))
+
+        return self.builder.build(customer_id, campaign_ids)
+
+
+class CustomerChunks:
+    """Tracks the chunks of one customer that are queued or in flight."""
+
+    def __init__(self, customer_id, count, max_in_flight):
+        self.customer_id = customer_id
+        self.remaining = count
+        self.semaphore = BoundedSemaphore(max_in_flight)
+        self.lock = Lock()
+
+    def add(self):
+        with self.lock:
+            self.remaining += 1
+
+    def chunk_done(self):
+        """Returns True once the customer's last chunk is done."""
+        with self.lock:
+            self.remaining -= 1
+            return not self.remaining
+
+
+def get_chunk_indexes(mutation, size):
+    """Returns the indexes of the chunks still to be sent for a customer."""
+    journal = mutation.journal
+    return [
+        chunk_index
+        for chunk_index in range(count_chunks(size['campaigns'], chunk_size))
+        if not (journal and journal.is_done(size['customer_id'], chunk_index))
+    ]
 
-def mutate_worker(
-    client, verbose, no_dry_run, is_pause, campaign_set_queue, progress_queue
-):
-    service = client.get_service('CampaignService', version='v19')
 
+def count_campaigns(mutation, sizes):
+    """Returns the number of campaigns in the chunks still to be sent."""
+    return sum(
+        min(chunk_size, size['campaigns'] - chunk_index * chunk_size)
+        for size in sizes
+        for chunk_index in get_chunk_indexes(mutation, size)
+    )
+
+
+def get_chunks(mutation, size):
+    """Returns (chunk index, chunk) pairs still to be sent for a customer.
+
+    The campaign ids are only loaded here, when the customer is up.
+    """
+    chunk_indexes = set(get_chunk_indexes(mutation, size))
+    if not chunk_indexes:
+        return []
+
+    campaign_ids = load_blob(size['campaign_set'])['campaign_ids']
+    return [
+        (chunk_index, chunk)
+        for chunk_index, chunk in enumerate(grouper(campaign_ids, chunk_size))
+        if chunk_index in chunk_indexes
+    ]
+
+
+def get_work_items(mutation, size):
+    chunks = get_chunks(mutation, size)
+    if not chunks:
+        return []
+
+    customer = CustomerChunks(
+        size['customer_id'], len(chunks), mutation.per_customer
+    )
+    return [(customer, chunk_index, chunk) for chunk_index, chunk in chunks]
+
+
+def mutate_chunk(mutation, customer_id, chunk_index, chunk):
+    client = mutation.client
+    limiter = mutation.limiter
+    campaign_ids = [campaign_id for campaign_id in chunk if campaign_id]
+    mutated = 0
+    attempt = 0
+
+    while campaign_ids:
+        if attempt:
+            request = mutation.builder.build(customer_id, campaign_ids)
+        else:
+            request = mutation.build_request(
+                customer_id, chunk_index, campaign_ids
+            )
+        response = limiter.call(mutation.service.mutate_campaigns, request)
+
+        retry = []
+        errors = get_partial_failures(client, response)
+        for index, campaign_id in enumerate(campaign_ids):
+            if index not in errors:
+                mutated += 1
+            elif (
+                is_retryable_failure(errors[index])
+                and attempt < limiter.max_retries
+            ):
+                retry.append(campaign_id)
+            else:
+                for name, message in errors[index]:
+                    mutation.failures.put(
+                        {
+                            'customer_id': customer_id,
+                            'campaign_id': campaign_id,
+                            'error': name,
+                            'message': message,
+                        }
+                    )
+
+        # Only the operations that failed for transient reasons are sent
+        # again, as a smaller request.
+        campaign_ids = retry
+        if retry:
+            time.sleep(limiter.backoff(attempt))
+            attempt += 1
+
+    return mutated
+
+
+def mutate_worker(mutation, chunk_queue, progress_queue):
     while True:
-        try:
-            sha1_hash = campaign_set_queue.get_nowait()
-        except Empty:
+        item = chunk_queue.get()
+        if item is None:
+            # Sentinel: no more chunks will be queued.
+            chunk_queue.task_done()
             return
 
+        customer, chunk_index, chunk = item
         try:
-            mutate_campaigns(
-                client,
-                service,
-                sha1_hash,
-                verbose,
-                no_dry_run,
-                is_pause,
-                campaign_set_queue,
-                progress_queue,
-            )
+            with customer.semaphore:
+                count = mutate_chunk(
+                    mutation, customer.customer_id, chunk_index, chunk
+                )
+            if mutation.journal:
+                mutation.journal.record(customer.customer_id, chunk_index)
+            progress_queue.put(('campaigns', count))
         except Exception:
             # We don't want this worker thread to die and block joining
             # at the end of the process.
             traceback.print_exc()
 
-        campaign_set_queue.task_done()
+        if customer.chunk_done():
+            progress_queue.put(('customers', 1))
+        chunk_queue.task_done()
 
 
 def get_all(queue):
@@ -217,40 +562,88 @@ def start_workers(num, func, args):
         Thread(target=func, args=args).start()
 
 
-def progress_monitor(totals, progress_queue, exit_queue):
+def progress_monitor(renderer, progress_queue, exit_queue):
     progress = defaultdict(int)
+    render_at = None
 
     while True:
-        metric, n = progress_queue.get()
-        progress[metric] += n
-
-        end = "\n" if metric == 'exit' else "\r"
-        print(
-            f" completed {progress['customers']}/{totals['customers']} "
-            f"customers and {progress['campaigns']} campaigns",
-            end=end,
-        )
+        timeout = None
+        if render_at is not None:
+            timeout = max(0, render_at - time.monotonic())
+        try:
+            metric, n = progress_queue.get(timeout=timeout)
+        except Empty:
+            renderer.render(progress)
+            render_at = None
+            continue
 
         if metric == 'exit':
+            renderer.render(progress, final=True)
             exit_queue.put(True)
             return
 
+        progress[metric] += n
+        # Updates arriving before the next tick are drawn together.
+        if render_at is None:
+            render_at = time.monotonic() + renderer.interval
+
 
-def start_progress_monitor(totals):
+def start_progress_monitor(args, phase, totals):
     progress_queue = Queue()
     exit_queue = Queue()
+    renderer = Renderer(args.progress, phase, totals)
     Thread(
-        target=progress_monitor, args=(totals, progress_queue, exit_queue)
+        target=progress_monitor,
+        args=(renderer, progress_queue, exit_queue),
     ).start()
     return progress_queue, exit_queue
 
 
-def collect(client, args):
-    customer_id_queue = Queue()
-    campaign_set_queue = Queue()
+def get_workers(args):
+    """Returns how many API calls the engine makes at once."""
+    if args.engine == 'asyncio':
+        return args.concurrency
+
+    return args.workers
+
+
+def create_limiter(args):
+    return AdaptiveLimiter(
+        get_workers(args), max_retries=args.max_retries, verbose=args.verbose
+    )
+
+
+def load_customer_clients(client, args, limiter):
+    login_customer_id = client.login_customer_id
+    clients = customer_cache.load(login_customer_id, args.customers_max_age)
+    if clients is not None:
+        print('[1/3] using the cached customer ids')
+        return clients
 
     print('[1/3] getting customer ids...')
-    customer_ids = collect_customer_ids(client)
+    clients = limiter.call(collect_customer_clients, client)
+    customer_cache.store(login_customer_id, clients)
+
+    return clients
+
+
+def queue_customer_ids(client, args, limiter, scope):
+    customer_id_queue = Queue()
+
+    customer_ids = serving_customer_ids(
+        load_customer_clients(client, args, limiter)
+    )
+    if scope.customer_ids:
+        found = len(customer_ids)
+        customer_ids = [c for c in customer_ids if scope.includes_customer(c)]
+        print(f'the scope has {len(customer_ids)} of the {found} customers')
+    if args.shard:
+        found = len(customer_ids)
+        customer_ids = [c for c in customer_ids if in_shard(args, c)]
+        print(
+            f'shard {format_shard(args.shard)} has {len(customer_ids)} of '
+            f'the {found} customers'
+        )
     customer_count = len(customer_ids)
 
     if customer_count == 1:
@@ -261,8 +654,25 @@ def collect(client, args):
     for customer_id in customer_ids:
         customer_id_queue.put(customer_id)
 
+    return customer_id_queue, customer_count
+
+
+def collect(client, args):
+    if args.engine == 'asyncio':
+        from . import aio
+
+        return aio.collect(client, args)
+
+    limiter = create_limiter(args)
+    scope = Scope.from_args(args)
+    customer_id_queue, customer_count = queue_customer_ids(
+        client, args, limiter, scope
+    )
+    previous = load_since(args, scope)
+    campaign_set_queue = Queue()
+
     progress_queue, exit_queue = start_progress_monitor(
-        {'customers': customer_count}
+        args, 'collect', {'customers': customer_count}
     )
     progress_queue.put_nowait(('init', 1))
 
@@ -272,6 +682,9 @@ def collect(client, args):
         retrieve_campaign_ids,
         (
             client,
+            limiter,
+            previous,
+            scope,
             args.verbose,
             customer_id_queue,
             campaign_set_queue,
@@ -283,51 +696,561 @@ def collect(client, args):
     progress_queue.put_nowait(('exit', 1))
     exit_queue.get()
 
-    campaign_sets = store_campaign_sets(get_all(campaign_set_queue))
+    campaign_sets = store_campaign_sets(
+        client, get_all(campaign_set_queue), scope.describe(), args.shard
+    )
     print(f'[2/3] committed campaign sets {campaign_sets}')
 
     return campaign_sets
 
 
-def pause_unpause(client, args, is_pause):
-    campaign_sets_id = args.campaign_sets or collect(client, args)
-    step_num = 1 if args.campaign_sets else 3
-    step = f'[{step_num}/{step_num}]'
+def collect_and_pause(client, args, failures):
+    if args.engine == 'asyncio':
+        from . import aio
 
-    print(f'{step} loading campaign sets {campaign_sets_id}...')
+        return aio.collect_and_pause(client, args, failures)
+
+    limiter = create_limiter(args)
+    scope = Scope.from_args(args)
+    customer_id_queue, customer_count = queue_customer_ids(
+        client, args, limiter, scope
+    )
+    previous = load_since(args, scope)
     campaign_set_queue = Queue()
-    campaign_sets = load_campaign_sets(campaign_sets_id)
-    for campaign_set in campaign_sets:
-        campaign_set_queue.put(campaign_set)
+    # Bounded, so collecting waits for pausing to catch up instead of
+    # piling up chunks.
+    chunk_queue = Queue(maxsize=2 * args.workers)
+    mutation = Mutation(client, args, True, limiter, failures, None)
 
     progress_queue, exit_queue = start_progress_monitor(
-        {'customers': len(campaign_sets)}
+        args, 'pause', {'customers': customer_count}
     )
     progress_queue.put_nowait(('init', 1))
 
-    print(f"{step} {'' if is_pause else 'un'}pausing campaigns...")
+    print('[2/3] getting campaign ids and pausing campaigns...')
+    start_workers(
+        args.workers, mutate_worker, (mutation, chunk_queue, progress_queue)
+    )
     start_workers(
         args.workers,
-        mutate_worker,
+        stream_and_queue,
         (
             client,
-            args.verbose,
-            args.no_dry_run,
-            is_pause,
+            limiter,
+            mutation,
+            previous,
+            scope,
+            customer_id_queue,
             campaign_set_queue,
+            chunk_queue,
             progress_queue,
         ),
     )
 
-    campaign_set_queue.join()
+    customer_id_queue.join()
+    for i in range(args.workers):
+        chunk_queue.put(None)
+    chunk_queue.join()
     progress_queue.put_nowait(('exit', 1))
     exit_queue.get()
 
+    campaign_sets = store_campaign_sets(
+        client, get_all(campaign_set_queue), scope.describe(), args.shard
+    )
+    print(f'[3/3] committed campaign sets {campaign_sets}')
+
+    return campaign_sets
+
+
+def open_journal(args, is_pause, campaign_sets_id):
+    # Dry runs don't change anything, so there is nothing to resume. An
+    # unpause of only the campaigns still paused resumes by itself.
+    if not args.no_dry_run or unpauses_only_paused(args, is_pause):
+        return None
+
+    # Shards running at the same time each keep a journal of their own.
+    name = f"{campaign_sets_id}-{'pause' if is_pause else 'unpause'}"
+    if args.shard:
+        name += '-' + format_shard(args.shard).replace('/', 'of')
+    journal = Journal(os.path.join(journal_directory, name), args.resume)
+    if journal.completed:
+        print(f'resuming, skipping {len(journal.completed)} finished chunks')
+
+    return journal
+
+
+def load_campaign_set_sizes(args, sha1_hashes):
+    """Returns the hash, customer id and number of campaigns of the
+    campaign sets in the shard, without loading their campaign ids."""
+    sizes = []
+    for sha1_hash in sha1_hashes:
+        customer_id, campaigns = blob_store.campaign_set_size(sha1_hash)
+        if in_shard(args, customer_id):
+            sizes.append(
+                {
+                    'campaign_set': sha1_hash,
+                    'customer_id': customer_id,
+                    'campaigns': campaigns,
+                }
+            )
+
+    return sizes
+
+
+def load_campaign_sets_to_send(client, args, is_pause, campaign_sets_id, step):
+    """Returns the sizes of the campaign sets to send, in the order to send
+    them."""
+    sha1_hashes = load_campaign_sets(campaign_sets_id)
+    if unpauses_only_paused(args, is_pause):
+        campaign_sets = [
+            campaign_set
+            for campaign_set in map(load_blob, sha1_hashes)
+            if in_shard(args, campaign_set['customer_id'])
+        ]
+        # Stored like any campaign set, and scheduled for what is
+        # actually sent.
+        sha1_hashes = [
+            store_customer_campaign_set(
+                campaign_set['customer_id'], campaign_set['campaign_ids']
+            )
+            for campaign_set in select_still_paused(
+                client, args, campaign_sets_id, campaign_sets, step
+            )
+        ]
+
+    return schedule_campaign_sets(
+        client, args, load_campaign_set_sizes(args, sha1_hashes), step
+    )
+
+
+def schedule_campaign_sets(client, args, sizes, step):
+    """Returns the campaign set sizes in the order to send them, the
+    largest first, and prints how long that is predicted to take."""
+    ordered = largest_first(sizes)
+
+    workers = get_workers(args)
+    predicted, in_hash_order = (
+        predict_makespan(
+            [count_chunks(c['campaigns'], chunk_size) for c in order],
+            workers,
+            args.per_customer,
+        )
+        for order in (ordered, sizes)
+    )
+    line = (
+        f'{step} scheduling largest customers first, predicted makespan '
+        f'{predicted} round trips ({in_hash_order} in hash order)'
+    )
+    seconds, _ = catalog.seconds_per_round_trip(
+        client.login_customer_id, args.engine, workers
+    )
+    if seconds is not None and predicted:
+        line += f', about {predicted * seconds:.1f}s as in earlier runs'
+    print(line)
+
+    return ordered
+
+
+def load_armed_requests(args, campaign_sets_id, is_pause, sizes, step):
+    # Armed requests cover every campaign of the campaign sets.
+    if unpauses_only_paused(args, is_pause):
+        return {}
+
+    try:
+        with open(os.path.join(armed_directory, campaign_sets_id)) as f:
+            armed = json.load(f)['pause' if is_pause else 'unpause']
+    except FileNotFoundError:
+        return {}
+
+    chunk_counts = {
+        c['customer_id']: count_chunks(c['campaigns'], chunk_size)
+        for c in sizes
+    }
+    armed = {
+        int(customer_id): sha1_hashes
+        for customer_id, sha1_hashes in armed.items()
+        if len(sha1_hashes) == chunk_counts.get(int(customer_id))
+    }
+    print(f'{step} using armed requests for {len(armed)} customers')
+
+    return armed
+
+
+def mutate_campaign_sets(client, args, is_pause, campaign_sets_id, failures):
+    if args.engine == 'asyncio':
+        from . import aio
+
+        return aio.mutate_campaign_sets(
+            client, args, is_pause, campaign_sets_id, failures
+        )
+
+    step_num = 1 if args.campaign_sets else 3
+    step = f'[{step_num}/{step_num}]'
+
+    print(f'{step} loading campaign sets {campaign_sets_id}...')
+    journal = open_journal(args, is_pause, campaign_sets_id)
+    sizes = load_campaign_sets_to_send(
+        client, args, is_pause, campaign_sets_id, step
+    )
+    mutation = Mutation(
+        client,
+        args,
+        is_pause,
+        create_limiter(args),
+        failures,
+        journal,
+        load_armed_requests(args, campaign_sets_id, is_pause, sizes, step),
+    )
+    # Counted from the sizes, before the journal marks chunks as done.
+    totals = {
+        'customers': len(sizes),
+        'campaigns': count_campaigns(mutation, sizes),
+    }
+    work = [get_work_items(mutation, c) for c in sizes]
+
+    chunk_queue = Queue()
+    for item in interleave(work, args.per_customer):
+        chunk_queue.put(item)
+    for i in range(args.workers):
+        chunk_queue.put(None)
+
+    progress_queue, exit_queue = start_progress_monitor(
+        args, 'pause' if is_pause else 'unpause', totals
+    )
+    progress_queue.put_nowait(('customers', sum(not w for w in work)))
+
+    print(f"{step} {'' if is_pause else 'un'}pausing campaigns...")
+    started = time.monotonic()
+    start_workers(
+        args.workers, mutate_worker, (mutation, chunk_queue, progress_queue)
+    )
+
+    chunk_queue.join()
+    progress_queue.put_nowait(('exit', 1))
+    exit_queue.get()
+    seconds = time.monotonic() - started
+    if journal:
+        journal.close()
+    report_makespan(
+        client,
+        args,
+        campaign_sets_id,
+        is_pause,
+        [len(items) for items in work],
+        seconds,
+        step,
+    )
+
+    return sizes
+
+
+def report_makespan(
+    client, args, campaign_sets_id, is_pause, chunk_counts, seconds, step
+):
+    """Prints how long the requests took against the predicted round
+    trips, and records it for plan to estimate from."""
+    workers = get_workers(args)
+    round_trips = predict_makespan(chunk_counts, workers, args.per_customer)
+    line = f'{step} makespan {seconds:.1f}s'
+    if round_trips:
+        line += (
+            f' for {round_trips} predicted round trips, '
+            f'{seconds / round_trips:.2f}s each'
+        )
+    print(line)
+    requests = sum(chunk_counts)
+    if not requests:
+        return
+
+    catalog.record_timing(
+        campaign_sets_id,
+        client.login_customer_id,
+        'pause' if is_pause else 'unpause',
+        args.engine,
+        workers,
+        args.per_customer,
+        requests,
+        round_trips,
+        seconds,
+    )
+
+
+def store_failures(campaign_sets_id, is_pause, failures):
+    failures = sorted(
+        get_all(failures),
+        key=lambda f: (f['customer_id'], f['campaign_id'], f['error']),
+    )
+    if not failures:
+        return
+
+    sha1_hash = blob_store.store_file(
+        {
+            'campaign_sets': campaign_sets_id,
+            'operation': 'pause' if is_pause else 'unpause',
+            'failures': failures,
+        }
+    )
+    print(
+        f'{len(failures)} operations failed, see '
+        f'{os.path.join(blob_directory, sha1_hash)}'
+    )
+
+
+def unpauses_only_paused(args, is_pause):
+    return not is_pause and not args.unpause_all
+
+
+def select_still_paused(client, args, campaign_sets_id, campaign_sets, step):
+    """Narrows the campaign sets down to the campaigns to unpause.
+
+    Those are the ones still paused, less those anybody changed since
+    the pause with --skip-changed.
+    """
+    limiter = create_limiter(args)
+    total = sum(len(c['campaign_ids']) for c in campaign_sets)
+    print(f'{step} checking which campaigns are still paused...')
+    campaign_sets = find_stragglers(
+        client, args, limiter, campaign_sets, 'PAUSED'
+    )
+    paused = sum(len(c['campaign_ids']) for c in campaign_sets)
+    print(f'{step} {paused} of {total} campaigns are still paused')
+
+    if not args.skip_changed:
+        return campaign_sets
+
+    paused_at = catalog.paused_at(client.login_customer_id, campaign_sets_id)
+    if paused_at is None:
+        print(
+            f'{step} these campaign sets were never paused according to '
+            f'the catalog, not skipping changed campaigns'
+        )
+        return campaign_sets
+
+    # Our own changes are all in before the pause is recorded. A minute
+    # on top keeps them out even if our clock is behind Google's.
+    after = datetime.fromtimestamp(paused_at + 60, timezone.utc)
+
+    def skip_changed(campaign_set):
+        customer_id = campaign_set['customer_id']
+        try:
+            changed = limiter.call(
+                collect_campaign_ids_changed_after, client, customer_id, after
+            )
+        except Exception:
+            traceback.print_exc()
+            changed = None
+        if changed is None:
+            print(
+                f'{step} could not tell which campaigns of customer '
+                f'{customer_id} were changed, unpausing all of them'
+            )
+            return campaign_set
+
+        return {
+            'customer_id': customer_id,
+            'campaign_ids': [
+                campaign_id
+                for campaign_id in campaign_set['campaign_ids']
+                if campaign_id not in changed
+            ],
+        }
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        campaign_sets = [
+            c
+            for c in executor.map(skip_changed, campaign_sets)
+            if c['campaign_ids']
+        ]
+    left = sum(len(c['campaign_ids']) for c in campaign_sets)
+    print(f'{step} skipping {paused - left} campaigns changed since the pause')
+
+    return campaign_sets
+
+
+def find_stragglers(client, args, limiter, campaign_sets, status):
+    """Returns the campaign sets narrowed to the campaigns in `status`."""
+
+    def check(campaign_set):
+        customer_id = campaign_set['customer_id']
+        try:
+            campaign_ids = limiter.call(
+                collect_campaign_ids_in_status,
+                client,
+                customer_id,
+                campaign_set['campaign_ids'],
+                status,
+            )
+        except Exception:
+            # Can't tell, so all of them are sent again.
+            traceback.print_exc()
+            campaign_ids = campaign_set['campaign_ids']
+
+        return {'customer_id': customer_id, 'campaign_ids': campaign_ids}
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        checked = executor.map(check, campaign_sets)
+        return [c for c in checked if c['campaign_ids']]
+
+
+def mutate_stragglers(mutation, args, stragglers):
+    def mutate(item):
+        customer_id, chunk_index, chunk = item
+        try:
+            mutate_chunk(mutation, customer_id, chunk_index, chunk)
+        except Exception:
+            traceback.print_exc()
+
+    items = [
+        (campaign_set['customer_id'], chunk_index, chunk)
+        for campaign_set in stragglers
+        for chunk_index, chunk in enumerate(
+            grouper(campaign_set['campaign_ids'], chunk_size)
+        )
+    ]
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(mutate, items))
+
+
+def verify(client, args, is_pause, campaign_sets, failures):
+    """Sends campaigns the mutations didn't stick for again.
+
+    Runs until every campaign has left the status it had, the deadline
+    passes or all that are left failed for reasons retrying won't fix.
+    Whatever is left ends up in `failures`, along with the failures of
+    campaigns verification didn't send again, e.g. removed ones.
+    """
+    status = 'ENABLED' if is_pause else 'PAUSED'
+    deadline = time.monotonic() + args.verify_deadline
+    limiter = create_limiter(args)
+    errors = defaultdict(list)
+    for failure in get_all(failures):
+        errors[failure['customer_id'], failure['campaign_id']].append(failure)
+
+    print(f'[verify] checking for campaigns still {status}...')
+    stragglers = campaign_sets
+    rounds = 0
+    failed_again = set()
+    sent_again = set()
+    while True:
+        stragglers = find_stragglers(client, args, limiter, stragglers, status)
+        left = {
+            (campaign_set['customer_id'], campaign_id)
+            for campaign_set in stragglers
+            for campaign_id in campaign_set['campaign_ids']
+        }
+        if not left:
+            print(f'[verify] no campaigns are {status} anymore')
+            break
+        if time.monotonic() >= deadline or left <= failed_again:
+            break
+
+        rounds += 1
+        sent_again |= left
+        print(
+            f'[verify] round {rounds}: sending {len(left)} campaigns in '
+            f'{len(stragglers)} customers again'
+        )
+        round_failures = Queue()
+        mutation = Mutation(
+            client, args, is_pause, limiter, round_failures, None
+        )
+        mutate_stragglers(mutation, args, stragglers)
+
+        failed_again = set()
+        for failure in get_all(round_failures):
+            key = failure['customer_id'], failure['campaign_id']
+            if key not in failed_again:
+                errors[key] = []
+                failed_again.add(key)
+            errors[key].append(failure)
+
+        # Give the changes a moment to show up in searches.
+        time.sleep(
+            min(limiter.backoff(rounds), max(deadline - time.monotonic(), 0))
+        )
+
+    if left:
+        print(
+            f'[verify] {len(left)} campaigns in {len(stragglers)} customers '
+            f'are still {status} after {rounds} rounds:'
+        )
+    for campaign_set in stragglers:
+        print(
+            f"  customer {campaign_set['customer_id']}: "
+            f"{len(campaign_set['campaign_ids'])} campaigns"
+        )
+    # The failures of campaigns sent again and changed since are resolved.
+    for customer_id, campaign_id in sorted(
+        left | (errors.keys() - sent_again)
+    ):
+        for failure in errors.get((customer_id, campaign_id)) or [
+            {
+                'customer_id': customer_id,
+                'campaign_id': campaign_id,
+                'error': 'unverified',
+                'message': f'still {status} after verification',
+            }
+        ]:
+            failures.put(failure)
+
+
+def resolve_campaign_sets(client, args):
+    if args.latest:
+        campaign_sets_id = catalog.latest(
+            client.login_customer_id, Scope.from_args(args).describe()
+        )
+        if campaign_sets_id is None:
+            print('no campaign sets in the catalog, run collect first')
+            sys.exit(-1)
+        print(f'using the latest campaign sets {campaign_sets_id}')
+    elif args.last_paused:
+        campaign_sets_id = catalog.last_paused(client.login_customer_id)
+        if campaign_sets_id is None:
+            print('no paused campaign sets in the catalog')
+            sys.exit(-1)
+        print(f'using the last paused campaign sets {campaign_sets_id}')
+    else:
+        campaign_sets_id = args.campaign_sets
+
+    return campaign_sets_id
+
+
+def pause_unpause(client, args, is_pause):
+    args.campaign_sets = resolve_campaign_sets(client, args)
+    failures = Queue()
+    if is_pause and args.stream and not args.campaign_sets:
+        campaign_sets_id = collect_and_pause(client, args, failures)
+        sha1_hashes = load_campaign_sets(campaign_sets_id)
+    else:
+        campaign_sets_id = args.campaign_sets or collect(client, args)
+        sha1_hashes = [
+            size['campaign_set']
+            for size in mutate_campaign_sets(
+                client, args, is_pause, campaign_sets_id, failures
+            )
+        ]
+
+    if args.verify and args.no_dry_run:
+        campaign_sets = list(map(load_blob, sha1_hashes))
+        verify(client, args, is_pause, campaign_sets, failures)
+    elif args.verify:
+        print('[verify] skipped, nothing changes in a dry run')
+    store_failures(campaign_sets_id, is_pause, failures)
+    # Shards run by run_in_processes leave it to the merged hash, which is
+    # the one that gets unpaused.
+    if args.no_dry_run and not getattr(args, 'merged_by_parent', False):
+        catalog.record_operation(
+            campaign_sets_id,
+            client.login_customer_id,
+            'pause' if is_pause else 'unpause',
+        )
     print('done')
     if is_pause:
         print('you can unpause by running')
         print(f'{sys.argv[0]} unpause --no-dry-run {campaign_sets_id}')
 
+    return campaign_sets_id
+
 
 def pause(client, args):
     return pause_unpause(client, args, True)
@@ -337,6 +1260,69 @@ def unpause(client, args):
     return pause_unpause(client, args, False)
 
 
+def arm(client, args):
+    campaign_sets_id = args.campaign_sets or collect(client, args)
+    step_num = 1 if args.campaign_sets else 3
+    step = f'[{step_num}/{step_num}]'
+
+    print(f'{step} arming campaign sets {campaign_sets_id}...')
+    campaign_sets = [
+        load_blob(sha1_hash)
+        for sha1_hash in load_campaign_sets(campaign_sets_id)
+    ]
+
+    armed = {}
+    for operation, is_pause in (('pause', True), ('unpause', False)):
+        builder = RequestBuilder(
+            client, is_pause, no_dry_run=True, partial_failure=False
+        )
+        armed[operation] = {
+            campaign_set['customer_id']: [
+                store_raw_blob(
+                    builder.build(
+                        campaign_set['customer_id'],
+                        [campaign_id for campaign_id in chunk if campaign_id],
+                    ).SerializeToString()
+                )
+                for chunk in grouper(campaign_set['campaign_ids'], chunk_size)
+            ]
+            for campaign_set in campaign_sets
+        }
+
+    with atomic_write(os.path.join(armed_directory, campaign_sets_id)) as f:
+        json.dump(armed, f, sort_keys=True)
+
+    print(f'{step} armed {sum(map(len, armed["pause"].values()))} requests')
+    print('you can pause by running')
+    print(f'{sys.argv[0]} pause --no-dry-run {campaign_sets_id}')
+
+    return campaign_sets_id
+
+
+def standby(client, args):
+    from .standby import serve
+
+    serve(client, args)
+
+
+def trigger(client, args):
+    from .standby import trigger
+
+    trigger(args)
+
+
+def status(client, args):
+    from .standby import status
+
+    status(args)
+
+
+def plan(client, args):
+    from .plan import plan
+
+    plan(args)
+
+
 def setup(client, args):
     print('All set up!')
 
@@ -356,10 +1342,139 @@ def parse_arguments(args):
         metavar='NUM',
         default=16,
     )
+    all_shared.add_argument(
+        '--engine',
+        help=(
+            'run API calls on a fixed pool of worker threads (threads) or '
+            'schedule them from an event loop (asyncio)'
+        ),
+        choices=('threads', 'asyncio'),
+        default='threads',
+    )
+    all_shared.add_argument(
+        '--concurrency',
+        help='with --engine=asyncio, keep up to NUM API calls in flight',
+        type=int,
+        metavar='NUM',
+        default=256,
+    )
+    all_shared.add_argument(
+        '--per-customer',
+        help='send at most NUM requests for the same customer at once',
+        type=int,
+        metavar='NUM',
+        default=4,
+    )
+    all_shared.add_argument(
+        '--max-retries',
+        help=(
+            'retry API calls failing with quota or transient errors up to '
+            'NUM times, backing off and lowering concurrency'
+        ),
+        type=int,
+        metavar='NUM',
+        default=8,
+    )
+    all_shared.add_argument(
+        '--progress',
+        help=(
+            'show progress on one terminal line (text) or as JSON objects, '
+            'one per line (jsonl)'
+        ),
+        choices=('text', 'jsonl'),
+        default='text',
+    )
+    all_shared.add_argument(
+        '--metrics-file',
+        help=(
+            'write latency, payload size, status code and retry metrics of '
+            'every API call to PATH in the Prometheus text format'
+        ),
+        metavar='PATH',
+    )
+    all_shared.add_argument(
+        '--shard',
+        help=(
+            'only work on the customers whose id modulo N is I, to spread '
+            'a run over N machines'
+        ),
+        type=parse_shard,
+        metavar='I/N',
+    )
+    all_shared.add_argument(
+        '--processes',
+        help=(
+            'split collect, pause or unpause into NUM shards, each run in '
+            'a process of its own, and merge their campaign sets'
+        ),
+        type=int,
+        metavar='NUM',
+        default=1,
+    )
     all_shared.add_argument('-v', '--verbose', action='store_true')
 
+    collect_shared = ArgumentParser(add_help=False)
+    collect_shared.add_argument(
+        '--customers-max-age',
+        help=(
+            'reuse the customer ids found by a run up to SECONDS ago '
+            '(0 to always look them up, the default except for collect '
+            f'and standby, which reuse them for {customers_max_age})'
+        ),
+        type=int,
+        metavar='SECONDS',
+    )
+    collect_shared.add_argument(
+        '--since',
+        help=(
+            'start from the campaign sets CAMPAIGN-SETS and only look at '
+            'campaigns changed since they were collected'
+        ),
+        metavar='CAMPAIGN-SETS',
+    )
+    collect_shared.add_argument(
+        '--label',
+        help='only campaigns with the label NAME (repeatable, any of them)',
+        action='append',
+        metavar='NAME',
+    )
+    collect_shared.add_argument(
+        '--name',
+        help='only campaigns whose name matches the RE2 regular expression',
+        metavar='REGEX',
+    )
+    collect_shared.add_argument(
+        '--channel-type',
+        help=(
+            'only campaigns of the advertising channel type TYPE, e.g. '
+            'SEARCH or SHOPPING (repeatable, any of them)'
+        ),
+        type=channel_type,
+        action='append',
+        metavar='TYPE',
+    )
+    collect_shared.add_argument(
+        '--geo-target',
+        help=(
+            'only campaigns targeting the geo target constant ID, e.g. 2840 '
+            'for the United States (repeatable, any of them)'
+        ),
+        type=int,
+        action='append',
+        metavar='ID',
+    )
+    collect_shared.add_argument(
+        '--customer',
+        help='only the customer CUSTOMER-ID (repeatable)',
+        type=int,
+        action='append',
+        metavar='CUSTOMER-ID',
+    )
+
     collect_parser = subparsers.add_parser(
-        'collect', help='only collect campaign ids', parents=[all_shared]
+        'collect',
+        help='only collect campaign ids',
+        parents=[all_shared, collect_shared],
     )
     collect_parser.set_defaults(func=collect)
 
@@ -369,9 +1484,43 @@ def parse_arguments(args):
         help='actually perform the mutations',
         action='store_true',
     )
+    mutation_shared.add_argument(
+        '--partial-failure',
+        help=(
+            'let valid operations succeed when others in the same request '
+            'fail; transient failures are retried, the rest are stored in '
+            'a failures blob'
+        ),
+        action='store_true',
+    )
+    mutation_shared.add_argument(
+        '--resume',
+        help=(
+            'skip the chunks an interrupted run with the same CAMPAIGN-SETS '
+            'already mutated'
+        ),
+        action='store_true',
+    )
+    mutation_shared.add_argument(
+        '--verify',
+        help=(
+            'check that the campaigns ended up with their new status and '
+            'send the ones that did not again'
+        ),
+        action='store_true',
+    )
+    mutation_shared.add_argument(
+        '--verify-deadline',
+        help='with --verify, give up after SECONDS',
+        type=int,
+        metavar='SECONDS',
+        default=300,
+    )
 
     pause_parser = subparsers.add_parser(
-        'pause', help='pause campaigns', parents=[all_shared, mutation_shared]
+        'pause',
+        help='pause campaigns',
+        parents=[all_shared, collect_shared, mutation_shared],
     )
     pause_parser.add_argument(
         'campaign_sets',
@@ -379,7 +1528,20 @@ def parse_arguments(args):
         metavar='CAMPAIGN-SETS',
         nargs='?',
     )
-    pause_parser.set_defaults(func=pause)
+    pause_parser.add_argument(
+        '--latest',
+        help='use the latest campaign sets in the catalog',
+        action='store_true',
+    )
+    pause_parser.add_argument(
+        '--stream',
+        help=(
+            'start pausing each customer as soon as its campaign ids are '
+            'collected (ignored when CAMPAIGN-SETS is given)'
+        ),
+        action='store_true',
+    )
+    pause_parser.set_defaults(func=pause, last_paused=False)
 
     unpause_parser = subparsers.add_parser(
         'unpause',
@@ -390,29 +1552,356 @@ def parse_arguments(args):
         'campaign_sets',
         help='use CAMPAIGN-SETS for unpausing (use the hash from pausing)',
         metavar='CAMPAIGN-SETS',
+        nargs='?',
+    )
+    unpause_parser.add_argument(
+        '--last-paused',
+        help=(
+            'use the campaign sets paused last, according to the catalog, '
+            'unless they were unpaused since'
+        ),
+        action='store_true',
     )
-    unpause_parser.set_defaults(func=unpause)
+    unpause_parser.add_argument(
+        '--unpause-all',
+        help=(
+            'send every campaign of CAMPAIGN-SETS, instead of only those '
+            'still paused'
+        ),
+        action='store_true',
+    )
+    unpause_parser.add_argument(
+        '--skip-changed',
+        help='leave campaigns anybody changed since the pause as they are',
+        action='store_true',
+    )
+    unpause_parser.set_defaults(func=unpause, latest=False)
+
+    arm_parser = subparsers.add_parser(
+        'arm',
+        help='prebuild pause and unpause requests for campaign sets',
+        parents=[all_shared, collect_shared],
+    )
+    arm_parser.add_argument(
+        'campaign_sets',
+        help='arm CAMPAIGN-SETS (collects new ones if not given)',
+        metavar='CAMPAIGN-SETS',
+        nargs='?',
+    )
+    arm_parser.set_defaults(func=arm)
+
+    socket_shared = ArgumentParser(add_help=False)
+    socket_shared.add_argument(
+        '--socket',
+        help='path of the standby socket',
+        metavar='PATH',
+        default=standby_socket,
+    )
+
+    standby_parser = subparsers.add_parser(
+        'standby',
+        help=(
+            'stay authenticated, keep collecting campaign ids and wait for '
+            'trigger'
+        ),
+        parents=[all_shared, collect_shared, socket_shared],
+    )
+    standby_parser.add_argument(
+        '--interval',
+        help='collect campaign ids again every SECONDS',
+        type=int,
+        metavar='SECONDS',
+        default=900,
+    )
+    standby_parser.set_defaults(func=standby)
+
+    trigger_parser = subparsers.add_parser(
+        'trigger',
+        help='have a running standby pause campaigns',
+        parents=[mutation_shared, socket_shared],
+    )
+    trigger_parser.set_defaults(func=trigger, offline=True)
+
+    status_parser = subparsers.add_parser(
+        'status',
+        help='show the health and snapshot age of a running standby',
+        parents=[socket_shared],
+    )
+    status_parser.set_defaults(func=status, offline=True)
+
+    merge_parser = subparsers.add_parser(
+        'merge',
+        help='merge the campaign sets of shards into one',
+        parents=[all_shared],
+    )
+    merge_parser.add_argument(
+        'campaign_sets',
+        help='merge CAMPAIGN-SETS',
+        metavar='CAMPAIGN-SETS',
+        nargs='+',
+    )
+    merge_parser.set_defaults(func=merge)
+
+    plan_parser = subparsers.add_parser(
+        'plan',
+        help=(
+            'show the requests a pause or unpause of campaign sets sends '
+            'and estimate how long it takes, without calling the API'
+        ),
+        parents=[all_shared],
+    )
+    plan_parser.add_argument(
+        'campaign_sets',
+        help='plan for CAMPAIGN-SETS',
+        metavar='CAMPAIGN-SETS',
+    )
+    plan_parser.set_defaults(func=plan, offline=True)
 
     setup_parser = subparsers.add_parser(
         'setup', help='set up authentication only', parents=[all_shared]
     )
     setup_parser.set_defaults(func=setup)
 
-    return parser.parse_args(args or ['pause', '--help'])
+    args = parser.parse_args(args or ['pause', '--help'])
+    if getattr(args, 'processes', 1) > 1 and args.func not in (
+        collect,
+        pause,
+        unpause,
+    ):
+        parser.error('--processes works with collect, pause and unpause')
+    if getattr(args, 'customers_max_age', 0) is None:
+        # A pause looks for accounts added since, unless asked not to.
+        args.customers_max_age = (
+            customers_max_age if args.func in (collect, standby) else 0
+        )
+    if args.func in (pause, unpause):
+        option = '--latest' if args.func is pause else '--last-paused'
+        from_catalog = args.latest or args.last_paused
+        if args.campaign_sets and from_catalog:
+            parser.error(f'give either CAMPAIGN-SETS or {option}')
+        if args.func is unpause and not (args.campaign_sets or from_catalog):
+            parser.error(f'give CAMPAIGN-SETS or {option}')
+    if args.func in (pause, arm) and Scope.from_args(args):
+        # The campaign sets given were collected already, with their own
+        # scope.
+        if args.campaign_sets or getattr(args, 'latest', False):
+            parser.error(
+                '--label, --name, --channel-type, --geo-target and '
+                '--customer only apply when collecting, not with '
+                'CAMPAIGN-SETS or --latest'
+            )
+
+    return args
+
+
+def create_client(credentials):
+    # A refresh of the access token, if needed, overlaps with what follows.
+    oauth_credentials, refreshing = load_credentials(credentials)
+
+    # The client library and its generated modules take a while to import,
+    # so this is only done for commands that talk to the API.
+    from google.ads.googleads.client import GoogleAdsClient
+    from google.ads.googleads.config import load_from_dict
+
+    # Not GoogleAdsClient.load_from_dict, which always refreshes the
+    # access token. The services and types are loaded lazily on first
+    # use, get that over with too.
+    config = load_from_dict(credentials)
+    client = GoogleAdsClient(
+        oauth_credentials,
+        config['developer_token'],
+        login_customer_id=config['login_customer_id'],
+        use_proto_plus=config['use_proto_plus'],
+    )
+    for name in ('GoogleAdsService', 'CampaignService'):
+        client.get_service(name, version='v19')
+    client.get_type('MutateCampaignsRequest', version='v19')
+    if refreshing:
+        refreshing.result()
+
+    return client
+
+
+def parse_shard(value):
+    try:
+        index, count = map(int, value.split('/'))
+    except ValueError:
+        raise ArgumentTypeError(f'expected I/N, got {value!r}')
+    if not 0 <= index < count:
+        raise ArgumentTypeError(f'I has to be from 0 to N-1, got {value!r}')
+
+    return index, count
+
+
+def format_shard(shard):
+    return f'{shard[0]}/{shard[1]}'
+
+
+def in_shard(args, customer_id):
+    if not args.shard:
+        return True
+
+    index, count = args.shard
+    return customer_id % count == index
+
+
+def merge_campaign_sets(client, campaign_sets_ids, shard=None):
+    """Returns the campaign sets of all of `campaign_sets_ids` in one, of
+    `shard` if they are shards of it."""
+    if len(set(campaign_sets_ids)) == 1:
+        return campaign_sets_ids[0]
+
+    # Shards of one run share their scope, which carries over. Merged
+    # scopes match no scope a --since could be run with.
+    scopes = sorted(
+        {
+            json.dumps(catalog.scope(campaign_sets_id), sort_keys=True)
+            for campaign_sets_id in campaign_sets_ids
+        }
+    )
+    return store_campaign_sets(
+        client,
+        {
+            sha1_hash
+            for campaign_sets_id in campaign_sets_ids
+            for sha1_hash in load_campaign_sets(campaign_sets_id)
+        },
+        (
+            json.loads(scopes[0])
+            if len(scopes) == 1
+            else {'merged': list(map(json.loads, scopes))}
+        ),
+        shard,
+    )
+
+
+def merge(client, args):
+    campaign_sets_id = merge_campaign_sets(client, args.campaign_sets)
+    print(f'merged into campaign sets {campaign_sets_id}')
+
+    return campaign_sets_id
+
+
+def run_shard(connect, args):
+    """Runs in a child process: the command for one shard."""
+    if args.progress == 'jsonl':
+        use_jsonl()
+    return execute(connect(), args, connect)
+
+
+def run_in_processes(client, args, connect):
+    """Runs the command in --processes processes, a shard each.
+
+    The campaign sets of the shards are merged into one hash, which
+    works with unpause and every other command just the same.
+    """
+    if 'latest' in args:
+        args.campaign_sets = resolve_campaign_sets(client, args)
+        args.latest = args.last_paused = False
+    if not getattr(args, 'campaign_sets', None):
+        # Found once here, the shards take the customers from the cache.
+        load_customer_clients(client, args, create_limiter(args))
+
+    # A shard of a shard: process j of machine i/N takes i + j*N of N*P.
+    index, count = args.shard or (0, 1)
+    shards = [
+        (index + j * count, count * args.processes)
+        for j in range(args.processes)
+    ]
+    print(
+        f'running {len(shards)} processes for the shards '
+        + ', '.join(map(format_shard, shards))
+    )
+
+    children = []
+    for shard in shards:
+        metrics_file = args.metrics_file
+        if metrics_file:
+            root, extension = os.path.splitext(metrics_file)
+            metrics_file = f'{root}-{shard[0]}of{shard[1]}{extension}'
+        children.append(
+            Namespace(
+                **{
+                    **vars(args),
+                    'processes': 1,
+                    'shard': shard,
+                    'metrics_file': metrics_file,
+                    # The customers just found by this process.
+                    'customers_max_age': float('inf'),
+                    'merged_by_parent': True,
+                }
+            )
+        )
+
+    # Forked children would share the parent's gRPC channels.
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(len(shards), mp_context=context) as executor:
+        campaign_sets_ids = list(
+            executor.map(run_shard, [connect] * len(shards), children)
+        )
+
+    campaign_sets_id = merge_campaign_sets(
+        client, campaign_sets_ids, args.shard
+    )
+    print(f'merged the shards into campaign sets {campaign_sets_id}')
+    if args.func in (pause, unpause):
+        if args.no_dry_run:
+            catalog.record_operation(
+                campaign_sets_id,
+                client.login_customer_id,
+                'pause' if args.func is pause else 'unpause',
+            )
+        if args.func is pause:
+            print('you can unpause all shards by running')
+            print(f'{sys.argv[0]} unpause --no-dry-run {campaign_sets_id}')
+
+    return campaign_sets_id
+
+
+def execute(client, args, connect=None):
+    """Runs the command, recording metrics if asked to.
+
+    `connect` returns a new client, for commands run in more than one
+    process.
+    """
+    if client and args.processes > 1:
+        return run_in_processes(client, args, connect)
+    if not (client and args.metrics_file):
+        return args.func(client and WarmClient(client), args)
+
+    from .metrics import MeteredClient, Metrics
+
+    shard = args.shard and format_shard(args.shard)
+    metrics = Metrics(args.metrics_file, shard)
+    metrics.write_every(metrics_interval)
+    try:
+        return args.func(WarmClient(MeteredClient(client, metrics)), args)
+    finally:
+        metrics.write()
 
 
 def run():
     os.makedirs(blob_directory, exist_ok=True)
+    os.makedirs(journal_directory, exist_ok=True)
+    os.makedirs(armed_directory, exist_ok=True)
     args = parse_arguments(sys.argv[1:])
+    if getattr(args, 'progress', None) == 'jsonl':
+        use_jsonl()
     print(banner)
 
-    credentials = {
-        **load_organization_auth(),
-        **load_user_auth(),
-        'use_proto_plus': False,
-    }
-
-    client = GoogleAdsClient.load_from_dict(credentials)
+    # Commands talking to a standby don't need a client of their own.
+    # Otherwise it is set up in the background while we wait for the
+    # confirmation below.
+    client = None
+    connect = None
+    if 'offline' not in args:
+        credentials = {
+            **load_organization_auth(),
+            **load_user_auth(),
+            'use_proto_plus': False,
+        }
+        connect = partial(create_client, credentials)
+        client = ThreadPoolExecutor(max_workers=1).submit(connect)
 
     if 'no_dry_run' in args:
         if args.no_dry_run:
@@ -426,7 +1915,9 @@ def run():
             print('*** THIS IS A DRY RUN ***')
             print('to perform a non-dry run, supply --no-dry-run')
 
-    args.func(client, args)
+    if client:
+        client = client.result()
+    execute(client, args, connect)
 
     if 'no_dry_run' in args and not args.no_dry_run:
         print('*** THIS WAS A DRY RUN ***')
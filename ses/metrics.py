@@ -0,0 +1,227 @@
+"""Per-RPC metrics (``--metrics-file``).
+
+Every call the client library makes goes through a gRPC interceptor that
+records its latency, payload sizes, status code and whether it was a
+retry, by method and customer. The totals are written in the Prometheus
+text format, e.g. for node_exporter's textfile collector: at the end of
+a run, and every few seconds while one is going.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+import grpc
+
+from .files import atomic_write
+from .limiter import current_attempt, status_code
+
+latency_buckets = (
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+counters = (
+    ('requests', 'API calls made.'),
+    ('retries', 'API calls that retried a failed one.'),
+    ('partial_failures', 'Mutate calls that failed for some operations.'),
+    ('request_bytes', 'Serialized size of the requests sent.'),
+    ('response_bytes', 'Serialized size of the responses received.'),
+)
+
+
+def format_labels(labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels)
+
+
+def serialized_size(message):
+    # Requests reach interceptors as proto-plus messages, responses as
+    # plain protobuf ones with use_proto_plus=False.
+    pb = getattr(type(message), 'pb', None)
+    return (pb(message) if pb else message).ByteSize()
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(latency_buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.buckets[bisect_left(latency_buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    def __init__(self, path, shard=None):
+        self.path = path
+        # Tells apart the files of shards running at the same time.
+        self.labels = (('shard', shard),) if shard else ()
+        self.lock = threading.Lock()
+        self.counters = {name: Counter() for name, _ in counters}
+        self.durations = defaultdict(Histogram)
+
+    def record(self, method, customer_id, code, seconds, **counts):
+        labels = self.labels + (
+            ('method', method),
+            ('customer_id', customer_id),
+        )
+        with self.lock:
+            self.counters['requests'][labels + (('code', code),)] += 1
+            for name, value in counts.items():
+                self.counters[name][labels] += value
+            self.durations[labels].observe(seconds)
+
+    def format(self):
+        lines = []
+        with self.lock:
+            for name, description in counters:
+                metric = f'ses_api_{name}_total'
+                lines.append(f'# HELP {metric} {description}')
+                lines.append(f'# TYPE {metric} counter')
+                for labels, value in sorted(self.counters[name].items()):
+                    lines.append(
+                        f'{metric}{{{format_labels(labels)}}} {value}'
+                    )
+
+            metric = 'ses_api_request_duration_seconds'
+            lines.append(f'# HELP {metric} Latency of API calls.')
+            lines.append(f'# TYPE {metric} histogram')
+            for labels, histogram in sorted(self.durations.items()):
+                cumulative = 0
+                for bound, count in zip(
+                    latency_buckets + ('+Inf',), histogram.buckets
+                ):
+                    cumulative += count
+                    bucket = format_labels(labels + (('le', bound),))
+                    lines.append(f'{metric}_bucket{{{bucket}}} {cumulative}')
+                labels = format_labels(labels)
+                lines.append(f'{metric}_sum{{{labels}}} {histogram.sum}')
+                lines.append(f'{metric}_count{{{labels}}} {histogram.count}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self):
+        with atomic_write(self.path) as f:
+            f.write(self.format())
+
+    def write_every(self, interval):
+        def write():
+            while True:
+                time.sleep(interval)
+                self.write()
+
+        threading.Thread(target=write, daemon=True).start()
+
+
+class MeteredStream:
+    """Records a streaming call once its responses have been read."""
+
+    def __init__(self, call, record):
+        self.call = call
+        self.record = record
+        self.response_bytes = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            response = next(self.call)
+        except StopIteration:
+            self.record('OK', self.response_bytes)
+            raise
+        except Exception as e:
+            self.record(status_code(e) or 'UNKNOWN', self.response_bytes)
+            raise
+
+        self.response_bytes += serialized_size(response)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.call, name)
+
+
+class MetricsInterceptor(
+    grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor
+):
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def recorder(self, client_call_details, request):
+        # '/google.ads.googleads.v19.services.CampaignService/...'
+        method = client_call_details.method.rsplit('.', 1)[-1]
+        request_bytes = serialized_size(request)
+        retry = current_attempt() > 0
+        started = time.monotonic()
+
+        def record(code, response_bytes, partial_failure=False):
+            self.metrics.record(
+                method,
+                request.customer_id,
+                code,
+                time.monotonic() - started,
+                retries=retry,
+                partial_failures=partial_failure,
+                request_bytes=request_bytes,
+                response_bytes=response_bytes,
+            )
+
+        return record
+
+    def intercept_unary_unary(
+        self, continuation, client_call_details, request
+    ):
+        record = self.recorder(client_call_details, request)
+        try:
+            call = continuation(client_call_details, request)
+            response = call.result()
+        except Exception as e:
+            record(status_code(e) or 'UNKNOWN', 0)
+            raise
+
+        error = getattr(response, 'partial_failure_error', None)
+        record('OK', serialized_size(response), bool(error and error.code))
+        return call
+
+    def intercept_unary_stream(
+        self, continuation, client_call_details, request
+    ):
+        record = self.recorder(client_call_details, request)
+        try:
+            call = continuation(client_call_details, request)
+        except Exception as e:
+            record(status_code(e) or 'UNKNOWN', 0)
+            raise
+
+        return MeteredStream(call, record)
+
+
+class MeteredClient:
+    """A GoogleAdsClient whose services record metrics of every call."""
+
+    def __init__(self, client, metrics):
+        self.client = client
+        self.metrics = metrics
+
+    def get_service(self, name, version):
+        return self.client.get_service(
+            name,
+            version=version,
+            interceptors=[MetricsInterceptor(self.metrics)],
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
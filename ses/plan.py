@@ -0,0 +1,93 @@
+"""Offline plan of a pause or unpause (``plan``).
+
+Works out from stored campaign sets how many requests a pause or unpause
+sends, for which customers, and which customer is on the critical path.
+The wall time is estimated from the round trips of earlier pauses and
+unpauses in the catalog. Nothing is sent to the API.
+"""
+
+from .main import (
+    catalog,
+    chunk_size,
+    get_workers,
+    load_campaign_set_sizes,
+    load_campaign_sets,
+)
+from .progress import format_duration
+from .schedule import count_chunks, finish_rounds, largest_first
+
+# Customers listed without --verbose.
+listed_customers = 10
+
+
+def plan(args):
+    campaign_sets = largest_first(
+        load_campaign_set_sizes(args, load_campaign_sets(args.campaign_sets))
+    )
+    workers = get_workers(args)
+    chunk_counts = [
+        count_chunks(c['campaigns'], chunk_size) for c in campaign_sets
+    ]
+    finished = finish_rounds(chunk_counts, workers, args.per_customer)
+    round_trips = max(finished, default=0)
+    operations = sum(c['campaigns'] for c in campaign_sets)
+
+    print(
+        f'campaign sets {args.campaign_sets}: {len(campaign_sets)} '
+        f'customers, {operations} operations in {sum(chunk_counts)} '
+        f'requests'
+    )
+    listed = len(campaign_sets) if args.verbose else listed_customers
+    for campaign_set, count, done in list(
+        zip(campaign_sets, chunk_counts, finished)
+    )[:listed]:
+        print(
+            f'  customer {campaign_set["customer_id"]}: '
+            f'{campaign_set["campaigns"]} operations in {count} '
+            f'requests, done after round trip {done}'
+        )
+    if len(campaign_sets) > listed:
+        print(f'  and {len(campaign_sets) - listed} more customers')
+    if not round_trips:
+        print('nothing to send')
+        return
+
+    # The customer done last holds the run up if even on its own it
+    # needs as many round trips, at the per-customer limit.
+    last = finished.index(round_trips)
+    customer_id = campaign_sets[last]['customer_id']
+    if -(-chunk_counts[last] // args.per_customer) == round_trips:
+        print(
+            f'critical path: customer {customer_id} with '
+            f'{chunk_counts[last]} requests, at most {args.per_customer} '
+            f'at once'
+        )
+    else:
+        print(
+            f'no critical path: the workers are busy until the end, '
+            f'customer {customer_id} is done last'
+        )
+    print(
+        f'{round_trips} round trips with {workers} workers '
+        f'({args.engine} engine), largest customers first'
+    )
+
+    snapshot = catalog.snapshot(args.campaign_sets)
+    if snapshot is None:
+        print('the campaign sets are not in the catalog, no estimate')
+        return
+    seconds, same_workers = catalog.seconds_per_round_trip(
+        snapshot['login_customer_id'], args.engine, workers
+    )
+    if seconds is None:
+        print(
+            f'no earlier pause or unpause with the {args.engine} engine in '
+            f'the catalog, no estimate'
+        )
+        return
+
+    print(
+        f'estimated {format_duration(round_trips * seconds)} at '
+        f'{seconds:.2f}s per round trip of earlier runs'
+        + ('' if same_workers else ' with other numbers of workers')
+    )
@@ -0,0 +1,123 @@
+"""Progress output (``--progress``).
+
+Workers only count; a renderer turns the counts into output at most
+once per tick, however fast they come in. ``text`` redraws one terminal
+line with throughput and an ETA, ``jsonl`` prints one JSON object per
+line for other tools to follow along. Everything else then goes to
+stderr, so stdout only carries the events.
+"""
+
+import json
+import sys
+import time
+from collections import deque
+
+# Seconds of history the rate is computed over.
+rate_window = 10
+# Where events go with --progress=jsonl, None otherwise.
+events = None
+
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f'{hours}h{minutes:02}m'
+    if minutes:
+        return f'{minutes}m{seconds:02}s'
+
+    return f'{seconds}s'
+
+
+def use_jsonl():
+    """Keeps stdout for events, sending the output for people to stderr."""
+    global events
+    events = sys.stdout
+    sys.stdout = sys.stderr
+
+
+def emit(event, **fields):
+    """Prints an event with --progress=jsonl, does nothing otherwise."""
+    if events is None:
+        return
+
+    print(
+        json.dumps(
+            {'event': event, 'time': time.time(), **fields}, sort_keys=True
+        ),
+        file=events,
+        flush=True,
+    )
+
+
+class Renderer:
+    def __init__(self, mode, phase, totals):
+        self.mode = mode
+        self.phase = phase
+        self.totals = totals
+        self.interval = 0.1 if mode == 'text' else 1.0
+        self.started = time.monotonic()
+        self.samples = deque([(self.started, 0, 0)])
+
+    def measure(self, progress):
+        """Returns campaigns per second and the ETA in seconds."""
+        now = time.monotonic()
+        self.samples.append(
+            (now, progress['campaigns'], progress['customers'])
+        )
+        while now - self.samples[1][0] > rate_window:
+            self.samples.popleft()
+
+        then, campaigns, customers = self.samples[0]
+        elapsed = max(now - then, 1e-9)
+        campaign_rate = (progress['campaigns'] - campaigns) / elapsed
+        customer_rate = (progress['customers'] - customers) / elapsed
+
+        # Campaigns are the better measure of the work left, but their
+        # total is only known when mutating a stored snapshot.
+        if 'campaigns' in self.totals and campaign_rate:
+            left = self.totals['campaigns'] - progress['campaigns']
+            eta = left / campaign_rate
+        elif customer_rate:
+            left = self.totals['customers'] - progress['customers']
+            eta = left / customer_rate
+        else:
+            eta = None
+
+        return campaign_rate, eta
+
+    def render(self, progress, final=False):
+        campaign_rate, eta = self.measure(progress)
+        if self.mode == 'jsonl':
+            emit(
+                'done' if final else 'progress',
+                phase=self.phase,
+                elapsed=time.monotonic() - self.started,
+                customers=progress['customers'],
+                customers_total=self.totals['customers'],
+                campaigns=progress['campaigns'],
+                campaigns_total=self.totals.get('campaigns'),
+                campaigns_per_second=campaign_rate,
+                eta_seconds=None if final else eta,
+            )
+            return
+
+        campaigns = progress['campaigns']
+        if 'campaigns' in self.totals:
+            campaigns = f"{campaigns}/{self.totals['campaigns']}"
+        line = (
+            f" completed {progress['customers']}/{self.totals['customers']} "
+            f"customers and {campaigns} campaigns"
+        )
+        if final:
+            elapsed = format_duration(time.monotonic() - self.started)
+            line += f' in {elapsed}'
+        else:
+            left = self.totals['customers'] - progress['customers']
+            line += f', {campaign_rate:.0f}/s, {left} customers left'
+            if eta is not None:
+                line += f', ETA {format_duration(eta)}'
+
+        # Pad to overwrite the rest of a longer previous line.
+        sys.stdout.write(f'{line:<79}' + ('\n' if final else '\r'))
+        sys.stdout.flush()
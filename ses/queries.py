@@ -0,0 +1,294 @@
+import re
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+match_customer_id = re.compile(r'^customers/\d+/customerClients/(\d+)$').match
+match_campaign_id = re.compile(r'^customers/\d+/campaigns/(\d+)$').match
+
+# The campaigns an emergency stop applies to.
+campaign_conditions = """
+    campaign.status = 'ENABLED'
+    AND campaign.experiment_type = 'BASE'
+    AND campaign.advertising_channel_type != 'VIDEO'
+    AND campaign.advertising_channel_type != 'LOCAL'"""
+
+# change_status only covers the last 90 days and requires a LIMIT.
+change_status_days = 89
+change_status_limit = 10000
+
+
+def parse_customer_id(resource_name):
+    return int(match_customer_id(resource_name).group(1))
+
+
+def parse_campaign_id(resource_name):
+    return int(match_campaign_id(resource_name).group(1))
+
+
+def gaql_string(value):
+    escaped = value.replace('\\', '\\\\').replace("'", "\\'")
+    return f"'{escaped}'"
+
+
+def query(service, customer_id, query):
+    return service.search_stream(customer_id=str(customer_id), query=query)
+
+
+def collect_customer_clients(client):
+    """Returns the enabled accounts under the login customer."""
+    service = client.get_service('GoogleAdsService', version='v19')
+    return [
+        {
+            'customer_id': parse_customer_id(
+                row.customer_client.resource_name
+            ),
+            'level': row.customer_client.level,
+            'manager': row.customer_client.manager,
+            'test_account': row.customer_client.test_account,
+        }
+        for response in query(
+            service,
+            client.login_customer_id,
+            """
+                SELECT
+                    customer_client.level,
+                    customer_client.manager,
+                    customer_client.test_account
+                FROM customer_client
+                WHERE customer_client.status = 'ENABLED'""",
+        )
+        for row in response.results
+    ]
+
+
+def collect_campaign_ids(client, customer_id, conditions=campaign_conditions):
+    service = client.get_service('GoogleAdsService', version='v19')
+    return [
+        row.campaign.id
+        for response in query(
+            service,
+            customer_id,
+            f"""
+                SELECT campaign.id
+                FROM campaign
+                WHERE {conditions}""",
+        )
+        for row in response.results
+    ]
+
+
+def stream_campaign_ids(client, customer_id, conditions=campaign_conditions):
+    """Yields the campaign ids of a customer, in ascending order."""
+    service = client.get_service('GoogleAdsService', version='v19')
+    for response in query(
+        service,
+        customer_id,
+        f"""
+            SELECT campaign.id
+            FROM campaign
+            WHERE {conditions}
+            ORDER BY campaign.id""",
+    ):
+        for row in response.results:
+            yield row.campaign.id
+
+
+def search_changed_campaign_ids(client, customer_id, start, end):
+    """Returns the ids of campaigns changed between `start` and `end`.
+
+    The times are in the account's time zone. Returns None when there
+    were more changes than one query returns.
+    """
+    service = client.get_service('GoogleAdsService', version='v19')
+    rows = [
+        row
+        for response in query(
+            service,
+            customer_id,
+            f"""
+                SELECT change_status.campaign
+                FROM change_status
+                WHERE
+                change_status.resource_type = 'CAMPAIGN'
+                AND change_status.last_change_date_time
+                BETWEEN '{start:%Y-%m-%d %H:%M:%S}'
+                AND '{end:%Y-%m-%d %H:%M:%S}'
+                LIMIT {change_status_limit}""",
+        )
+        for row in response.results
+    ]
+    if len(rows) >= change_status_limit:
+        return None
+
+    return {parse_campaign_id(row.change_status.campaign) for row in rows}
+
+
+def collect_changed_campaign_ids(client, customer_id, since):
+    """Returns the ids of campaigns changed since `since`.
+
+    Returns None when change_status can't tell, because `since` is too
+    long ago or there were more changes than one query returns.
+    """
+    now = datetime.now()
+    if now - since > timedelta(days=change_status_days):
+        return None
+
+    # change_status times are in the account's time zone, which may be
+    # up to a day off from ours.
+    return search_changed_campaign_ids(
+        client,
+        customer_id,
+        since - timedelta(days=1),
+        now + timedelta(days=1),
+    )
+
+
+def collect_time_zone(client, customer_id):
+    service = client.get_service('GoogleAdsService', version='v19')
+    for response in query(
+        service,
+        customer_id,
+        """
+            SELECT customer.time_zone
+            FROM customer""",
+    ):
+        for row in response.results:
+            return ZoneInfo(row.customer.time_zone)
+
+
+def collect_campaign_ids_changed_after(client, customer_id, after):
+    """Returns the ids of campaigns changed after `after`.
+
+    `after` has to be time zone aware. Returns None when change_status
+    can't tell, like collect_changed_campaign_ids.
+    """
+    time_zone = collect_time_zone(client, customer_id)
+    now = datetime.now(time_zone)
+    if now - after > timedelta(days=change_status_days):
+        return None
+
+    return search_changed_campaign_ids(
+        client,
+        customer_id,
+        after.astimezone(time_zone),
+        now + timedelta(days=1),
+    )
+
+
+def search_campaign_ids(client, customer_id, campaign_ids, conditions):
+    """Returns which of `campaign_ids` match the GAQL `conditions`."""
+    service = client.get_service('GoogleAdsService', version='v19')
+    campaign_ids = sorted(campaign_ids)
+    matching = []
+
+    for i in range(0, len(campaign_ids), 1000):
+        chunk = campaign_ids[i : i + 1000]  # noqa: E203
+        id_list = ', '.join(map(str, chunk))
+        matching.extend(
+            row.campaign.id
+            for response in query(
+                service,
+                customer_id,
+                f"""
+                    SELECT campaign.id
+                    FROM campaign
+                    WHERE campaign.id IN ({id_list})
+                    AND {conditions}""",
+            )
+            for row in response.results
+        )
+
+    return matching
+
+
+def collect_matching_campaign_ids(
+    client, customer_id, campaign_ids, conditions=campaign_conditions
+):
+    """Returns which of `campaign_ids` an emergency stop applies to."""
+    return search_campaign_ids(client, customer_id, campaign_ids, conditions)
+
+
+def collect_campaign_ids_in_status(client, customer_id, campaign_ids, status):
+    """Returns which of `campaign_ids` have the status `status`."""
+    return search_campaign_ids(
+        client, customer_id, campaign_ids, f"campaign.status = '{status}'"
+    )
+
+
+def collect_campaign_ids_since(
+    client, customer_id, since, campaign_ids, conditions=campaign_conditions
+):
+    """Applies the changes since `since` to a customer's campaign ids.
+
+    Returns None if the changes are not available and the customer has
+    to be scanned in full.
+    """
+    changed = collect_changed_campaign_ids(client, customer_id, since)
+    if changed is None:
+        return None
+    if not changed:
+        return campaign_ids
+
+    unchanged = set(campaign_ids) - changed
+    matching = collect_matching_campaign_ids(
+        client, customer_id, changed, conditions
+    )
+
+    return sorted(unchanged.union(matching))
+
+
+def collect_label_resource_names(client, customer_id, names):
+    """Returns the resource names of a customer's labels named `names`."""
+    service = client.get_service('GoogleAdsService', version='v19')
+    name_list = ', '.join(map(gaql_string, names))
+    return sorted(
+        row.label.resource_name
+        for response in query(
+            service,
+            customer_id,
+            f"""
+                SELECT label.resource_name
+                FROM label
+                WHERE label.name IN ({name_list})""",
+        )
+        for row in response.results
+    )
+
+
+def collect_geo_targeted_campaign_ids(client, customer_id, geo_target_ids):
+    """Returns the ids of campaigns targeting any of `geo_target_ids`."""
+    service = client.get_service('GoogleAdsService', version='v19')
+    constants = ', '.join(
+        f"'geoTargetConstants/{geo_target_id}'"
+        for geo_target_id in geo_target_ids
+    )
+    return sorted(
+        {
+            row.campaign.id
+            for response in query(
+                service,
+                customer_id,
+                f"""
+                    SELECT campaign.id
+                    FROM campaign_criterion
+                    WHERE campaign_criterion.type = 'LOCATION'
+                    AND campaign_criterion.negative = FALSE
+                    AND campaign_criterion.location.geo_target_constant
+                    IN ({constants})""",
+            )
+            for row in response.results
+        }
+    )
+
+
+def ping(client):
+    """Sends a minimal query, which keeps the channel and token warm."""
+    service = client.get_service('GoogleAdsService', version='v19')
+    for response in query(
+        service,
+        client.login_customer_id,
+        """
+            SELECT customer.id
+            FROM customer""",
+    ):
+        pass
@@ -0,0 +1,74 @@
+"""Ordering of mutation work.
+
+A customer with many campaigns needs many mutate requests, of which only
+a few may be in flight at once. If it gets picked up last it becomes the
+critical path while the other workers sit idle, so customers are handed
+out largest first (LPT scheduling).
+"""
+
+
+def count_chunks(campaigns, chunk_size):
+    return -(-campaigns // chunk_size)
+
+
+def largest_first(campaign_set_sizes):
+    return sorted(
+        campaign_set_sizes, key=lambda c: c['campaigns'], reverse=True
+    )
+
+
+def finish_rounds(chunk_counts, workers, per_customer=None):
+    """Returns the round trip in which each customer's last request goes.
+
+    `chunk_counts` lists the requests needed per customer in the order
+    they are dispatched. Every round trip, each of the `workers` sends one
+    request, taking customers in order and at most `per_customer` requests
+    for the same customer (no limit if None). Customers without requests
+    are done after round trip 0.
+    """
+    finished = [0] * len(chunk_counts)
+    remaining = [[i, n] for i, n in enumerate(chunk_counts) if n]
+    rounds = 0
+
+    while remaining:
+        rounds += 1
+        slots = workers
+        for customer in remaining:
+            if not slots:
+                break
+            taken = min(customer[1], slots, per_customer or customer[1])
+            customer[1] -= taken
+            slots -= taken
+            if not customer[1]:
+                finished[customer[0]] = rounds
+
+        remaining = [customer for customer in remaining if customer[1]]
+
+    return finished
+
+
+def predict_makespan(chunk_counts, workers, per_customer=None):
+    """Returns the number of request round trips the run will take.
+
+    See finish_rounds for how requests are dispatched.
+    """
+    return max(finish_rounds(chunk_counts, workers, per_customer), default=0)
+
+
+def interleave(work, wave_size):
+    """Yields the items of per-customer lists in waves.
+
+    Each wave takes up to `wave_size` items from every list that still
+    has some, in list order. With `wave_size` set to the per-customer
+    limit, workers rarely pick up an item of a customer that is already
+    at its limit.
+    """
+    position = 0
+    while True:
+        wave = [items for items in work if len(items) > position]
+        if not wave:
+            return
+
+        for items in wave:
+            yield from items[position : position + wave_size]  # noqa: E203
+        position += wave_size
@@ -0,0 +1,126 @@
+"""Scoped emergency stops (``--label``, ``--name``, ``--channel-type``,
+``--geo-target`` and ``--customer``).
+
+A scope narrows down the campaigns an emergency stop applies to. It is
+compiled into the WHERE clause of the campaign queries, so the API only
+returns campaigns in scope. Labels and geo targets can't be referred to
+by name in that clause; they are looked up in each account first, one
+query each. The resulting campaign sets are like any other.
+"""
+
+from .queries import (
+    campaign_conditions,
+    collect_geo_targeted_campaign_ids,
+    collect_label_resource_names,
+    gaql_string,
+)
+
+
+def gaql_list(values):
+    return '(' + ', '.join(values) + ')'
+
+
+def channel_type(value):
+    """Parses an advertising channel type, e.g. ``search``."""
+    from google.ads.googleads.v19.enums.types import advertising_channel_type
+
+    name = value.upper()
+    types = advertising_channel_type.AdvertisingChannelTypeEnum
+    if name not in types.AdvertisingChannelType.__members__:
+        raise ValueError(value)
+
+    return name
+
+
+class Scope:
+    def __init__(
+        self,
+        labels=(),
+        name=None,
+        channel_types=(),
+        geo_targets=(),
+        customer_ids=(),
+    ):
+        self.labels = sorted(set(labels))
+        self.name = name
+        self.channel_types = sorted(set(channel_types))
+        self.geo_targets = sorted(set(geo_targets))
+        self.customer_ids = sorted(set(customer_ids))
+
+        conditions = [campaign_conditions]
+        if name:
+            conditions.append(
+                f'campaign.name REGEXP_MATCH {gaql_string(name)}'
+            )
+        if self.channel_types:
+            types = gaql_list(map(gaql_string, self.channel_types))
+            conditions.append(f'campaign.advertising_channel_type IN {types}')
+        self.static_conditions = '\n    AND '.join(conditions)
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(
+            labels=getattr(args, 'label', None) or (),
+            name=getattr(args, 'name', None),
+            channel_types=getattr(args, 'channel_type', None) or (),
+            geo_targets=getattr(args, 'geo_target', None) or (),
+            customer_ids=getattr(args, 'customer', None) or (),
+        )
+
+    def describe(self):
+        """Returns the scope as a dict for the catalog, empty if unscoped."""
+        return {
+            key: value
+            for key, value in (
+                ('labels', self.labels),
+                ('name', self.name),
+                ('channel_types', self.channel_types),
+                ('geo_targets', self.geo_targets),
+                ('customer_ids', self.customer_ids),
+            )
+            if value
+        }
+
+    def __bool__(self):
+        return bool(self.describe())
+
+    def follows_changes(self):
+        """Returns whether the campaigns changed since a snapshot are all
+        that can have entered or left the scope.
+
+        Labels are attached and geo targets added without the campaign
+        itself changing, so change_status doesn't report those.
+        """
+        return not (self.labels or self.geo_targets)
+
+    def includes_customer(self, customer_id):
+        return not self.customer_ids or customer_id in self.customer_ids
+
+    def conditions(self, client, customer_id):
+        """Returns the GAQL conditions for a customer's campaigns in scope.
+
+        Returns None when none of them can be: the customer has none of
+        the labels, or no campaign targets any of the geo targets.
+        """
+        conditions = [self.static_conditions]
+
+        if self.labels:
+            resource_names = collect_label_resource_names(
+                client, customer_id, self.labels
+            )
+            if not resource_names:
+                return None
+            labels = gaql_list(map(gaql_string, resource_names))
+            conditions.append(f'campaign.labels CONTAINS ANY {labels}')
+
+        if self.geo_targets:
+            campaign_ids = collect_geo_targeted_campaign_ids(
+                client, customer_id, self.geo_targets
+            )
+            if not campaign_ids:
+                return None
+            conditions.append(
+                f'campaign.id IN {gaql_list(map(str, campaign_ids))}'
+            )
+
+        return '\n    AND '.join(conditions)
@@ -0,0 +1,33 @@
+"""Services shared by all requests of a run.
+
+Every query and mutation asks the client for its service, which with a
+plain GoogleAdsClient means a new gRPC channel, and so a new connection
+and TLS handshake, each time.
+"""
+
+from threading import Lock
+
+
+class WarmClient:
+    """A GoogleAdsClient that keeps its services around.
+
+    GoogleAdsClient.get_service opens a new gRPC channel on every call,
+    this hands out the same service, and so the same channel, each time.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.services = {}
+        self.lock = Lock()
+
+    def get_service(self, name, version):
+        with self.lock:
+            if (name, version) not in self.services:
+                self.services[name, version] = self.client.get_service(
+                    name, version=version
+                )
+
+            return self.services[name, version]
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
@@ -0,0 +1,301 @@
+"""Hot standby (``standby``, ``trigger`` and ``status``).
+
+``standby`` keeps one authenticated client with open gRPC channels and
+recollects campaigns every ``--interval`` seconds, each time starting
+from the previous snapshot. It listens on a Unix socket, where
+``trigger`` starts a pause from the latest snapshot without paying for
+startup, authentication or collecting first, and ``status`` reports its
+health.
+
+Requests and replies on the socket are single lines of JSON.
+"""
+
+import json
+import os
+import socket
+import sys
+import time
+import traceback
+from argparse import Namespace
+from socketserver import StreamRequestHandler, ThreadingUnixStreamServer
+from threading import Event, Lock, Thread
+
+from .main import blob_store, catalog, collect, pause_unpause
+from .queries import ping
+
+heartbeat_interval = 60
+
+
+def age(timestamp):
+    return None if timestamp is None else time.time() - timestamp
+
+
+class Standby:
+    def __init__(self, client, args):
+        self.client = client
+        self.args = args
+        self.lock = Lock()
+        self.running = Lock()
+        self.stopping = Event()
+
+        self.campaign_sets = args.since
+        self.collected_at = None
+        if args.since:
+            self.collected_at = blob_store.stored_at(args.since)
+        self.paused = None
+        self.heartbeat_at = None
+        self.last_error = None
+
+    def fail(self, e):
+        traceback.print_exc()
+        with self.lock:
+            self.last_error = f'{type(e).__name__}: {e}'
+
+    def refresh(self):
+        with self.lock:
+            args = Namespace(
+                **{**vars(self.args), 'since': self.campaign_sets}
+            )
+
+        campaign_sets = collect(self.client, args)
+        with self.lock:
+            # A collect that overlapped a pause may have seen some of the
+            # paused campaigns; keep the snapshot that can unpause them.
+            if self.paused is None and not self.running.locked():
+                self.campaign_sets = campaign_sets
+                self.collected_at = time.time()
+
+    def check_unpaused(self):
+        """Returns whether the paused campaign sets were unpaused since, in
+        which case the standby is ready for the next incident."""
+        with self.lock:
+            paused = self.paused
+        if paused is None or catalog.is_paused(
+            self.client.login_customer_id, paused
+        ):
+            return False
+
+        with self.lock:
+            self.paused = None
+        return True
+
+    def heartbeat(self):
+        ping(self.client)
+        with self.lock:
+            self.heartbeat_at = time.time()
+
+    def run(self):
+        next_refresh = 0
+        while not self.stopping.is_set():
+            if self.check_unpaused():
+                # Campaigns may have been added during the incident.
+                next_refresh = 0
+            if time.monotonic() >= next_refresh:
+                # While paused, this only looks for the unpause every
+                # interval.
+                if self.paused is None:
+                    try:
+                        self.refresh()
+                    except Exception as e:
+                        self.fail(e)
+                next_refresh = time.monotonic() + self.args.interval
+
+            try:
+                self.heartbeat()
+            except Exception as e:
+                self.fail(e)
+
+            self.stopping.wait(
+                min(
+                    heartbeat_interval, max(next_refresh - time.monotonic(), 0)
+                )
+            )
+
+    def state(self):
+        if self.running.locked():
+            return 'pausing'
+        if self.paused:
+            return 'paused'
+
+        return 'ready' if self.campaign_sets else 'collecting'
+
+    def status(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'state': self.state(),
+                'campaign_sets': self.campaign_sets,
+                'snapshot_age': age(self.collected_at),
+                'paused': self.paused,
+                'heartbeat_age': age(self.heartbeat_at),
+                'last_error': self.last_error,
+            }
+
+    def pause(self, request, reply):
+        if not self.running.acquire(blocking=False):
+            reply({'event': 'failed', 'error': 'a pause is already running'})
+            return
+
+        try:
+            with self.lock:
+                campaign_sets = self.campaign_sets
+                snapshot_age = age(self.collected_at)
+            reply(
+                {
+                    'event': 'started',
+                    'campaign_sets': campaign_sets,
+                    'snapshot_age': snapshot_age,
+                }
+            )
+
+            # Without a snapshot yet, collect and pause in one go.
+            args = Namespace(
+                **{
+                    **vars(self.args),
+                    'campaign_sets': campaign_sets,
+                    'latest': False,
+                    'last_paused': False,
+                    'since': None,
+                    'stream': True,
+                    'no_dry_run': request['no_dry_run'],
+                    'partial_failure': request['partial_failure'],
+                    'resume': request['resume'],
+                    'verify': request['verify'],
+                    'verify_deadline': request['verify_deadline'],
+                }
+            )
+            campaign_sets = pause_unpause(self.client, args, True)
+            if request['no_dry_run']:
+                with self.lock:
+                    self.paused = campaign_sets
+
+            reply({'event': 'done', 'campaign_sets': campaign_sets})
+        except Exception as e:
+            self.fail(e)
+            reply({'event': 'failed', 'error': f'{type(e).__name__}: {e}'})
+        finally:
+            self.running.release()
+
+
+class RequestHandler(StreamRequestHandler):
+    def reply(self, obj):
+        # The pause carries on if whoever triggered it went away.
+        try:
+            self.wfile.write(json.dumps(obj).encode('utf-8') + b'\n')
+            self.wfile.flush()
+        except OSError:
+            pass
+
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        standby = self.server.standby
+
+        if request['command'] == 'status':
+            self.reply(standby.status())
+        elif request['command'] == 'pause':
+            standby.pause(request, self.reply)
+
+
+def is_listening(path):
+    with socket.socket(socket.AF_UNIX) as s:
+        try:
+            s.connect(path)
+        except OSError:
+            return False
+
+    return True
+
+
+def serve(client, args):
+    if is_listening(args.socket):
+        print(f'a standby is already listening on {args.socket}')
+        sys.exit(-1)
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+
+    standby = Standby(client, args)
+
+    umask = os.umask(0o077)
+    try:
+        server = ThreadingUnixStreamServer(args.socket, RequestHandler)
+    finally:
+        os.umask(umask)
+    server.daemon_threads = True
+    server.standby = standby
+    Thread(target=server.serve_forever, daemon=True).start()
+    print(f'standby listening on {args.socket}')
+
+    try:
+        standby.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        os.unlink(args.socket)
+
+
+def send(path, request):
+    """Sends a request to the standby on `path` and yields its replies."""
+    with socket.socket(socket.AF_UNIX) as s:
+        try:
+            s.connect(path)
+        except OSError:
+            print(f'no standby is listening on {path}')
+            sys.exit(-1)
+
+        s.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with s.makefile('rb') as f:
+            for line in f:
+                yield json.loads(line)
+
+
+def format_age(seconds):
+    return 'never' if seconds is None else f'{seconds:.0f}s ago'
+
+
+def trigger(args):
+    request = {
+        'command': 'pause',
+        'no_dry_run': args.no_dry_run,
+        'partial_failure': args.partial_failure,
+        'resume': args.resume,
+        'verify': args.verify,
+        'verify_deadline': args.verify_deadline,
+    }
+    for reply in send(args.socket, request):
+        if reply['event'] == 'started':
+            if reply['campaign_sets']:
+                print(
+                    f'standby is pausing campaign sets '
+                    f'{reply["campaign_sets"]} collected '
+                    f'{format_age(reply["snapshot_age"])}'
+                )
+            else:
+                print('standby has no snapshot yet, collecting and pausing')
+        elif reply['event'] == 'done':
+            print('done')
+            print('you can unpause by running')
+            print(
+                f'{sys.argv[0]} unpause --no-dry-run {reply["campaign_sets"]}'
+            )
+        else:
+            print(f'standby failed: {reply["error"]}')
+            sys.exit(-1)
+
+
+def status(args):
+    reply = next(send(args.socket, {'command': 'status'}))
+    print(f'standby {reply["pid"]} is {reply["state"]}')
+    if reply['campaign_sets']:
+        print(
+            f'campaign sets {reply["campaign_sets"]} collected '
+            f'{format_age(reply["snapshot_age"])}'
+        )
+    else:
+        print('no campaign sets collected yet')
+    if reply['paused']:
+        print(f'paused campaign sets {reply["paused"]}')
+    print(f'last heartbeat {format_age(reply["heartbeat_age"])}')
+    if reply['last_error']:
+        print(f'last error: {reply["last_error"]}')
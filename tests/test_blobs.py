@@ -0,0 +1,86 @@
+"""Campaign set hashes match those of the legacy JSON blobs.
+
+Campaign sets are packed as int64 arrays, but named by the sha1 of the
+JSON file they used to be stored as, so hashes in the catalog, in
+journals and in people's notes keep working. These store campaign sets
+every way the store can, with BlobStore.store_campaign_set, with a
+CampaignSetWriter and as legacy JSON files, and check that the hashes
+are the same and that every one of them loads back.
+
+    pipenv run python -m unittest discover -s tests
+"""
+
+import os
+import random
+import tempfile
+import unittest
+from hashlib import sha1
+
+from ses.blobs import BlobStore, CampaignSetWriter, canonical_json
+
+customer_id = 1234567890
+
+
+def legacy_hash(campaign_set):
+    return sha1(canonical_json(campaign_set)).hexdigest()
+
+
+def write(store, campaign_set):
+    writer = store.campaign_set_writer(campaign_set['customer_id'])
+    try:
+        for campaign_id in campaign_set['campaign_ids']:
+            writer.add(campaign_id)
+        return writer.commit()
+    finally:
+        writer.close()
+
+
+def sample(count):
+    return sorted(random.Random(count).sample(range(10**10, 10**11), count))
+
+
+class CampaignSetHashTest(unittest.TestCase):
+    campaign_sets = {
+        'empty': [],
+        'one campaign': [10**10],
+        'largest ids': [2**62, 2**63 - 1],
+        'one buffer': sample(CampaignSetWriter.buffer_size),
+        'several buffers': sample(3 * CampaignSetWriter.buffer_size + 1),
+    }
+
+    def check(self, campaign_set):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        packed, streamed, legacy = (
+            BlobStore(os.path.join(directory.name, name))
+            for name in ('packed', 'streamed', 'legacy')
+        )
+        for store in (packed, streamed, legacy):
+            os.mkdir(store.directory)
+        expected = legacy_hash(campaign_set)
+        size = campaign_set['customer_id'], len(campaign_set['campaign_ids'])
+        self.assertEqual(packed.store_campaign_set(**campaign_set), expected)
+        self.assertEqual(write(streamed, campaign_set), expected)
+        self.assertEqual(legacy.store_file(campaign_set), expected)
+
+        # Fresh stores, so nothing comes from what was cached while
+        # storing. Hashes from before the pack resolve to their JSON file.
+        directories = packed.directory, streamed.directory, legacy.directory
+        for store in map(BlobStore, directories):
+            self.assertEqual(store.load(expected), campaign_set)
+            self.assertEqual(store.campaign_set_size(expected), size)
+
+        # Storing a legacy campaign set again keeps its hash.
+        legacy = BlobStore(legacy.directory)
+        self.assertEqual(legacy.store_campaign_set(**campaign_set), expected)
+
+    def test_hashes(self):
+        for name, campaign_ids in self.campaign_sets.items():
+            with self.subTest(name):
+                self.check(
+                    {'customer_id': customer_id, 'campaign_ids': campaign_ids}
+                )
+
+
+if __name__ == '__main__':
+    unittest.main()